@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+
+class JWKSFetchError(Exception):
+    """The JWKS document could not be fetched or read."""
+
+
+class JWKSKeyStore:
+    """Keeps the signing keys from a JWKS document in memory, indexed by kid.
+
+    Keys are refreshed every `ttl` seconds by a background thread. A lookup
+    for an unknown kid triggers an on demand fetch, but no sooner than
+    `min_fetch_interval` seconds after the last successful fetch or the
+    last failed on demand one; requests that arrive while a fetch is
+    running wait for it and then reuse its result. The lookup whose fetch
+    fails raises JWKSFetchError, the ones after it in the same interval
+    get None without waiting on the network, and known kids keep being
+    served from the last good key set throughout.
+
+    `jwks_url` is passed straight to urlopen, so tests can point it at a
+    file:// path or a local stub server instead of Auth0.
+    """
+
+    def __init__(self, jwks_url, ttl=600, min_fetch_interval=30, timeout=5):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_fetch_interval = min_fetch_interval
+        self.timeout = timeout
+        self._keys = {}
+        self._last_fetch = None
+        self._last_failed_attempt = None
+        self._fetch_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the background refresh thread if it is not running yet."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._refresh_loop,
+            name='jwks-refresh',
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_key(self, kid):
+        """Returns the RSA key dict for `kid`, or None if the JWKS has no such key.
+        """
+        self.start()
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        with self._fetch_lock:
+            # another request may have fetched while we waited for the lock
+            key = self._keys.get(kid)
+            if key is not None:
+                return key
+            if self._recent(self._last_fetch) or self._recent(self._last_failed_attempt):
+                return None
+            try:
+                self._fetch()
+            except JWKSFetchError:
+                self._last_failed_attempt = time.monotonic()
+                raise
+            return self._keys.get(kid)
+
+    def _recent(self, moment):
+        return moment is not None and time.monotonic() - moment < self.min_fetch_interval
+
+    def refresh(self):
+        """Fetches the JWKS document now, regardless of the rate limit."""
+        with self._fetch_lock:
+            self._fetch()
+
+    def _fetch(self):
+        # only called with _fetch_lock held
+        try:
+            jsonurl = urlopen(self.jwks_url, timeout=self.timeout)
+            jwks = json.loads(jsonurl.read())
+
+            keys = {}
+            for key in jwks['keys']:
+                keys[key['kid']] = {
+                    'kty': key['kty'],
+                    'kid': key['kid'],
+                    'use': key['use'],
+                    'n': key['n'],
+                    'e': key['e']
+                }
+        except Exception as error:
+            raise JWKSFetchError(f'Unable to fetch {self.jwks_url}: {error}') from error
+        # swap the whole dict so readers never see a half built key set
+        self._keys = keys
+        # only a successful fetch holds off the next on demand one
+        self._last_fetch = time.monotonic()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                # keep serving the last good key set until the next attempt
+                pass
+            self._stop.wait(self.ttl)
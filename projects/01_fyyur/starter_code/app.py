@@ -4,17 +4,27 @@
 import sys
 import json
 from datetime import datetime
+from itertools import groupby
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy import and_, case, cast, or_, type_coerce
+from sqlalchemy.dialects.postgresql import JSON, JSONB
 import logging
-from logging import Formatter, FileHandler
+from logging import Formatter
 from flask_wtf import Form
 from forms import *
+from search import Search
+from cache import CachedValue, PageCache, invalidate_on_commit
+from importer import import_data
+from perf import Profiler
+from logqueue import queue_file_logging
+from db_pool import register_health_routes
+from datefmt import DateTimeFormatter
+from assets import Assets
+from booking import BOOKED, DUPLICATE, NO_ARTIST, NO_VENUE, ShowBooking
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -28,11 +38,37 @@ db = SQLAlchemy(app)
 # TODO: connect to a local postgresql database
 migrate = Migrate(app, db)
 
+# per-request SQL and render timings, Server-Timing headers and /_perf
+if app.config.get('PERF_INSTRUMENTATION'):
+  profiler = Profiler(app)
+
+# flask import-data venues|artists|shows <file>
+app.cli.add_command(import_data)
+
+# /healthz and /metrics, connection pool status without a database round trip
+register_health_routes(app, db)
+
+# fingerprinted, precompressed static files once `flask build-assets` has run
+assets = Assets(app)
+
+# page size of the /shows listing
+SHOWS_PER_PAGE = 30
+# page size of the venue and artist search results
+SEARCH_RESULTS_PER_PAGE = 20
+# seconds the /venues overview is cached for
+VENUE_AREAS_TTL = 60
+# past and upcoming shows listed on a venue or artist page
+SHOWS_PER_DETAIL_PAGE = 20
+
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# genre lists; JSONB on Postgres so the ix_*_genres GIN indexes can answer
+# "which rows list this genre" (see genre_filter)
+GenreList = JSON().with_variant(JSONB(), 'postgresql')
+
 class Venue(db.Model):
     __tablename__ = 'venue'
     id = db.Column(db.Integer, primary_key=True)
@@ -41,7 +77,7 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(JSON)
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
@@ -49,6 +85,12 @@ class Venue(db.Model):
     website = db.Column(db.String(500))
 
     shows = db.relationship('Show', back_populates="venue", lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin',
+                 postgresql_ops={'genres': 'jsonb_path_ops'}),
+    )
+
     def __repr__(self):
       return f'<Artist {self.id} {self.name} {self.city} {self.state} {self.address} {self.phone} {self.genres} {self.image_link} {self.facebook_link} {self.seeking_talent}>'
 
@@ -60,7 +102,7 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(JSON)
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(500))
@@ -68,6 +110,12 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(500))
 
     shows = db.relationship('Show',  back_populates="artist", lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin',
+                 postgresql_ops={'genres': 'jsonb_path_ops'}),
+    )
+
     def __repr__(self):
       return f'<Artist {self.id} {self.name} {self.city} {self.state} {self.phone} {self.genres} {self.image_link} {self.facebook_link}>'
 
@@ -82,17 +130,155 @@ class Show(db.Model):
     artist =  db.relationship('Artist',  back_populates="shows", lazy=True)
     start_time = db.Column(db.DateTime)
 
+    # backs the keyset pagination of /shows and the past/upcoming
+    # split of the venue and artist pages; on Postgres ShowBooking also
+    # adds ex_show_venue_slot, which keeps a venue's shows from overlapping
+    __table_args__ = (
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.UniqueConstraint('venue_id', 'artist_id', 'start_time',
+                            name='uq_show_venue_artist_start_time'),
+    )
+
+# name, "city, state" and genre search over venues and artists
+searcher = Search(db, (Venue, Artist))
+
+# new shows, checked and inserted by the database in one statement
+show_booking = ShowBooking(db, Show, Venue, Artist)
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def with_upcoming_counts(model, show_key, ids):
+  '''The rows of `model` with the given ids, in that order, each with num_upcoming_shows.
+
+  The counts come from one query, an outer join on the upcoming shows
+  grouped by `model.id`, instead of one Show query per row.
+  `show_key` is the Show column that references `model`.
+  '''
+  if not ids:
+    return []
+  upcoming = and_(show_key == model.id, Show.start_time > datetime.now())
+  rows = db.session.query(model.id, model.name, db.func.count(Show.id).label('num_upcoming_shows')) \
+    .outerjoin(Show, upcoming) \
+    .filter(model.id.in_(ids)) \
+    .group_by(model.id, model.name) \
+    .all()
+  byId = {row.id: row for row in rows}
+  return [byId[id] for id in ids if id in byId]
+
+def shows_around_now(show_key, entity_id, other, other_key):
+  '''The past and upcoming shows of one venue or artist, with their counts.
+
+  `show_key` is the Show column holding `entity_id`, `other` the model on
+  the other side of the shows and `other_key` the Show column referencing
+  it. The counts are aggregated by the database and the lists are limited
+  to SHOWS_PER_DETAIL_PAGE rows, so every query is a range scan of the
+  (show_key, start_time) index.
+  '''
+  now = datetime.now()
+  upcoming = Show.start_time > now
+  past = Show.start_time <= now
+
+  counts = db.session.query(
+      db.func.count(case([(upcoming, 1)])),
+      db.func.count(case([(past, 1)]))
+    ).filter(show_key == entity_id).one()
+
+  def listShows(condition, order):
+    return db.session.query(
+        other.id, other.name, other.image_link, Show.start_time
+      ).join(other, other_key == other.id) \
+      .filter(show_key == entity_id, condition) \
+      .order_by(order) \
+      .limit(SHOWS_PER_DETAIL_PAGE) \
+      .all()
+
+  pastShows = listShows(past, Show.start_time.desc())
+  upcomingShows = listShows(upcoming, Show.start_time)
+  return pastShows, upcomingShows, counts[1], counts[0]
+
+def genre_filter(model, genre):
+  # `genres @> '["<genre>"]'` on Postgres, answered by the ix_<table>_genres
+  # GIN index; elsewhere a match on the stored JSON text, which is exact
+  # because genre is one of the GENRES choices
+  if db.engine.dialect.name == 'postgresql':
+    return model.genres.op('@>')(type_coerce([genre], JSONB))
+  return cast(model.genres, db.Text).like('%' + json.dumps(genre) + '%')
+
+def build_venue_areas(genre=None):
+  # one query for every venue with its upcoming show count, ordered so that
+  # the venues of an area are adjacent and can be grouped in a single pass
+  upcoming = and_(Show.venue_id == Venue.id, Show.start_time > datetime.now())
+  venueQuery = db.session.query(
+      Venue.id, Venue.name, Venue.city, Venue.state,
+      db.func.count(Show.id).label('num_upcoming_shows')
+    ).outerjoin(Show, upcoming)
+  if genre is not None:
+    venueQuery = venueQuery.filter(genre_filter(Venue, genre))
+  rows = venueQuery \
+    .group_by(Venue.id, Venue.name, Venue.city, Venue.state) \
+    .order_by(Venue.state, Venue.city, Venue.name, Venue.id) \
+    .all()
+
+  areas = []
+  for (city, state), cityVenues in groupby(rows, key=lambda row: (row.city, row.state)):
+    venueList = []
+    for venue in cityVenues:
+      venueList.append({
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": venue.num_upcoming_shows
+      })
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": venueList
+    })
+  if genre is None:
+    app.logger.info('venue areas rebuilt: %d areas', len(areas))
+  return areas
+
+# the /venues overview, rebuilt when a venue or show changes; the ttl ages
+# out upcoming show counts of shows that have started in the meantime
+venue_areas = CachedValue(build_venue_areas, ttl=VENUE_AREAS_TTL)
+invalidate_on_commit((Venue, Show), venue_areas.invalidate)
+
+# rendered venue and artist pages, dropped when the entity, one of its
+# shows or a venue or artist it has shows with is written; backend and ttl
+# come from the PAGE_CACHE_* settings
+page_cache = PageCache.from_config(app.config)
+
+def invalidate_show_pages(kind, column, condition):
+  # a venue page shows the names and images of its artists and an artist
+  # page those of its venues; the session has committed by now, so the
+  # ids are read on a connection of their own
+  with db.engine.connect() as connection:
+    ids = [id for id, in connection.execute(db.select([column]).where(condition).distinct())]
+  for id in ids:
+    page_cache.invalidate(kind, id)
+
+def invalidate_pages(model, values):
+  if model is Venue:
+    page_cache.invalidate('venue', values['id'])
+    invalidate_show_pages('artist', Show.artist_id, Show.venue_id == values['id'])
+  elif model is Artist:
+    page_cache.invalidate('artist', values['id'])
+    invalidate_show_pages('venue', Show.venue_id, Show.artist_id == values['id'])
+  elif model is Show:
+    page_cache.invalidate('venue', values['venue_id'])
+    page_cache.invalidate('artist', values['artist_id'])
+
+invalidate_on_commit((Venue, Artist, Show), invalidate_pages)
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+# takes datetimes or date strings, memoizes recent results (see datefmt.py)
+format_datetime = DateTimeFormatter()
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -112,66 +298,50 @@ def index():
 
 @app.route('/venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
+  genre = request.args.get('genre')
+  if genre is not None and genre not in GENRES.values:
+    return not_found_error(404)
   try:
-    for distinctCityVenue in Venue.query.distinct(Venue.city):
-      cityVenues = Venue.query.filter_by(city=distinctCityVenue.city).order_by('name').all()
-      cityName = cityVenues[0].city
-      stateName = cityVenues[0].state
-      venueList = []
-      
-      for venue in cityVenues:
-        venueItem = {
-          "id": venue.id,
-          "name": venue.name
-        }
-        venueList.append(venueItem)
-        app.logger.info('venueList data = ' + str(venueList))
-
-      cityItem = {
-        "city": cityName,
-        "state": stateName,
-        "venues" :venueList
-      }
-      data.append(cityItem)
-      app.logger.info('dataList data = ' + str(data))
-    return render_template('pages/venues.html', areas=data)
+    if genre is None:
+      areas = venue_areas.get()
+    else:
+      areas = build_venue_areas(genre)
+    return render_template('pages/venues.html', areas=areas, genre=genre)
   except:
-      return redirect(url_for('server_error'))
+    return server_error(500)
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   try:
     search_term = request.form["search_term"]
-    search_like = "%{}%".format(search_term)
-    app.logger.info('search_like = ' + str(search_like))
-    venues = Venue.query.filter(Venue.name.ilike(search_like)).all()
-    app.logger.info('venues = ' + str(venues))
+    page = request.form.get('page', 1, type=int)
+    app.logger.info('search_term = %s', search_term)
+
+    count, ids = searcher.search(Venue, search_term, page, SEARCH_RESULTS_PER_PAGE)
+    venues = with_upcoming_counts(Venue, Show.venue_id, ids)
 
     venueList = []
     for venueData in venues:
-      num_upcoming_shows = len(Show.query.filter_by(venue_id=venueData.id).all())
-      app.logger.info('num_upcoming_shows = ' + str(num_upcoming_shows))
       venueItem = {
         "id": venueData.id,
-        "name": venueData.name, 
-        "num_upcoming_shows": num_upcoming_shows,
+        "name": venueData.name,
+        "num_upcoming_shows": venueData.num_upcoming_shows,
       }
       venueList.append(venueItem)
-      app.logger.info('venueList data = ' + str(venueList))
-    
+
     response={
-      "count": len(venues),
-      "data": venueList
+      "count": count,
+      "data": venueList,
+      "page": page,
+      "has_next": page * SEARCH_RESULTS_PER_PAGE < count
     }
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
   except :
-    server_error(500)
+    return server_error(500)
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached('venue', 'venue_id')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
@@ -181,38 +351,28 @@ def show_venue(venue_id):
     if venueDat is None:
       return not_found_error(404)
 
-    showList = Show.query.filter_by(venue_id=venue_id).limit(3).all()
+    pastRows, upcomingRows, pastCount, upcomingCount = shows_around_now(
+      Show.venue_id, venue_id, Artist, Show.artist_id)
 
-    # TODO: filter condition for before and after date
     pastShows = []
-    for pastShow in showList:
-      artist = Artist.query.get(pastShow.artist_id)
-      pastShow = {
-        "artist_id": artist.id,
-        "artist_name": artist.name,
-        "artist_image_link": artist.image_link,
-        "start_time": "2019-05-21T21:30:00.000Z"
-      }
-      pastShows.append(pastShow)
-    app.logger.info('pastShows data = ' + str(pastShows))
+    for show in pastRows:
+      pastShows.append({
+        "artist_id": show.id,
+        "artist_name": show.name,
+        "artist_image_link": show.image_link,
+        "start_time": show.start_time
+      })
 
     upcomingShows = []
-    for upcomingShow in showList:
-      artist = Artist.query.get(upcomingShow.artist_id)
-      upcomingShow = {
-        "artist_id": artist.id,
-        "artist_name": artist.name,
-        "artist_image_link": artist.image_link,
-        "start_time": "2019-05-21T21:30:00.000Z"
-      }
-      upcomingShows.append(upcomingShow)
-    app.logger.info('upcomingShows data = ' + str(upcomingShows))
+    for show in upcomingRows:
+      upcomingShows.append({
+        "artist_id": show.id,
+        "artist_name": show.name,
+        "artist_image_link": show.image_link,
+        "start_time": show.start_time
+      })
 
-    showGenres = []
-    if venueDat.genres is not None: 
-      app.logger.info('Genres = ' + str(json.dumps(venueDat.genres)))
-      app.logger.info('Type =' + str(type(venueDat.genres)))
-      showGenres = json.loads(json.dumps(venueDat.genres))
+    showGenres = venueDat.genres or []
 
     data={
       "id": venueDat.id,
@@ -229,8 +389,8 @@ def show_venue(venue_id):
       "image_link": venueDat.image_link,
       "past_shows":pastShows,
       "upcoming_shows": upcomingShows,
-      "past_shows_count": len(pastShows),
-      "upcoming_shows_count": len(upcomingShows),
+      "past_shows_count": pastCount,
+      "upcoming_shows_count": upcomingCount,
     }
     return render_template('pages/show_venue.html', venue=data)
   except :
@@ -302,10 +462,14 @@ def delete_venue(venue_id):
 @app.route('/artists')
 def artists():
   # TODO: render error page for no data or error
+  genre = request.args.get('genre')
+  if genre is not None and genre not in GENRES.values:
+    return not_found_error(404)
   try:
-    allArtist = Artist.query.all()
-    if allArtist is None:
-      return not_found_error(404)
+    artistQuery = db.session.query(Artist.id, Artist.name)
+    if genre is not None:
+      artistQuery = artistQuery.filter(genre_filter(Artist, genre))
+    allArtist = artistQuery.order_by(Artist.id).all()
 
     artistList = []
     for artist in allArtist:
@@ -314,8 +478,8 @@ def artists():
         "name": artist.name
       }
       artistList.append(artistItem)
-    app.logger.info('pastShows data = ' + str(artistList))
-    return render_template('pages/artists.html', artists=artistList)
+    app.logger.debug('artistList data = %s', artistList)
+    return render_template('pages/artists.html', artists=artistList, genre=genre)
   except:
       return server_error(500)
 
@@ -323,75 +487,66 @@ def artists():
 def search_artists():
   try:
     search_term = request.form["search_term"]
-    search_like = "%{}%".format(search_term)
-    app.logger.info('search_like = ' + str(search_like))
-    artists = Artist.query.filter(Artist.name.ilike(search_like)).all()
-    app.logger.info('artist = ' + str(artists))
+    page = request.form.get('page', 1, type=int)
+    app.logger.info('search_term = %s', search_term)
+
+    count, ids = searcher.search(Artist, search_term, page, SEARCH_RESULTS_PER_PAGE)
+    artists = with_upcoming_counts(Artist, Show.artist_id, ids)
 
     artistList = []
     for artistData in artists:
-      num_upcoming_shows = len(Show.query.filter_by(artist_id=artistData.id).all())
-      app.logger.info('num_upcoming_shows = ' + str(num_upcoming_shows))
       artistItem = {
         "id": artistData.id,
-        "name": artistData.name, 
-        "num_upcoming_shows": num_upcoming_shows,
+        "name": artistData.name,
+        "num_upcoming_shows": artistData.num_upcoming_shows,
       }
       artistList.append(artistItem)
-      app.logger.info('venueList data = ' + str(artistList))
-    
+
     response={
-      "count": len(artists),
-      "data": artistList
+      "count": count,
+      "data": artistList,
+      "page": page,
+      "has_next": page * SEARCH_RESULTS_PER_PAGE < count
     }
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
   except :
-    server_error(500)
+    return server_error(500)
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached('artist', 'artist_id')
 def show_artist(artist_id):
   try:
     artistDat = Artist.query.get(artist_id)
     if artistDat is None:
       return not_found_error(404)
 
-    showList = Show.query.filter_by(artist_id=artist_id).limit(3).all()
+    pastRows, upcomingRows, pastCount, upcomingCount = shows_around_now(
+      Show.artist_id, artist_id, Venue, Show.venue_id)
 
-    # TODO: filter with time for past and upcoing shows
     pastShows = []
-    for pastShow in showList:
-      artist = Artist.query.get(pastShow.artist_id)
-      pastShow = {
-        "venue_id": artist.id,
-        "venue_name": artist.name,
-        "venue_image_link": artist.image_link,
-        "start_time": "2019-05-21T21:30:00.000Z"
-      }
-      pastShows.append(pastShow)
-    app.logger.info('pastShows data = ' + str(pastShows))
+    for show in pastRows:
+      pastShows.append({
+        "venue_id": show.id,
+        "venue_name": show.name,
+        "venue_image_link": show.image_link,
+        "start_time": show.start_time
+      })
 
     upcomingShows = []
-    for upcomingShow in showList:
-      artist = Artist.query.get(upcomingShow.artist_id)
-      upcomingShow = {
-        "venue_id": artist.id,
-        "venue_name": artist.name,
-        "venue_image_link": artist.image_link,
-        "start_time": "2019-05-21T21:30:00.000Z"
-      }
-      upcomingShows.append(upcomingShow)
-    app.logger.info('upcomingShows data = ' + str(upcomingShows))
+    for show in upcomingRows:
+      upcomingShows.append({
+        "venue_id": show.id,
+        "venue_name": show.name,
+        "venue_image_link": show.image_link,
+        "start_time": show.start_time
+      })
 
-    showGenres = []
-    if artistDat.genres is not None: 
-      app.logger.info('Genres = ' + str(json.dumps(artistDat.genres)))
-      app.logger.info('Type =' + str(type(artistDat.genres)))
-      showGenres = json.loads(json.dumps(artistDat.genres))
+    showGenres = artistDat.genres or []
 
     data={
       "id": artistDat.id,
       "name": artistDat.name,
-      "genres": [showGenres],
+      "genres": showGenres,
       "city": artistDat.city,
       "state": artistDat.state,
       "phone": artistDat.phone,
@@ -402,8 +557,8 @@ def show_artist(artist_id):
       "image_link": artistDat.image_link,
       "past_shows": pastShows,
       "upcoming_shows": upcomingShows,
-      "past_shows_count": len(pastShows),
-      "upcoming_shows_count": len(upcomingShows),
+      "past_shows_count": pastCount,
+      "upcoming_shows_count": upcomingCount,
     }
     return render_template('pages/show_artist.html', artist=data)
   except:
@@ -420,8 +575,7 @@ def edit_artist(artist_id):
     if artist is None:
       return not_found_error(404)
 
-    app.logger.info('venue =' + str(artist))
-    app.logger.info('Type =' + str(type(artist)))
+    app.logger.debug('artist = %s', artist)
     artistData={
       "id": artist.id,
       "name": artist.name,
@@ -578,24 +732,55 @@ def create_artist_submission():
 @app.route('/shows')
 def shows():
   # displays list of shows at /shows
-  # TODO: date ti be implemented
+  # keyset pagination over (start_time, id): the page after the show
+  # (after_time, after_id) costs the same however deep into the list it is
+  after_time = request.args.get('after_time')
+  after_id = request.args.get('after_id', type=int)
+
+  showQuery = db.session.query(
+      Show.id,
+      Show.start_time,
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(Show.start_time.isnot(None))
+
+  if after_time is not None and after_id is not None:
+    try:
+      afterTime = dateutil.parser.parse(after_time)
+      showQuery = showQuery.filter(or_(
+        Show.start_time > afterTime,
+        and_(Show.start_time == afterTime, Show.id > after_id)
+      ))
+    except (ValueError, OverflowError):
+      # unreadable cursor, start from the first page
+      pass
+
+  # one extra row tells us whether there is a next page
+  rows = showQuery.order_by(Show.start_time, Show.id).limit(SHOWS_PER_PAGE + 1).all()
 
-  shows = Show.query.all()
   dispList = []
-  for show in shows:
-    venue = Venue.query.get(show.venue_id)
-    artist = Artist.query.get(show.artist_id)
+  for row in rows[:SHOWS_PER_PAGE]:
     dispItem = {
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "artist_id": artist.id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "start_time": "2019-05-21T21:30:00.000Z"
+      "venue_id": row.venue_id,
+      "venue_name": row.venue_name,
+      "artist_id": row.artist_id,
+      "artist_name": row.artist_name,
+      "artist_image_link": row.artist_image_link,
+      "start_time": row.start_time
     }
     dispList.append(dispItem)
 
-  return render_template('pages/shows.html', shows=dispList)
+  nextPage = None
+  if len(rows) > SHOWS_PER_PAGE:
+    lastRow = rows[SHOWS_PER_PAGE - 1]
+    nextPage = url_for('shows', after_time=lastRow.start_time.isoformat(), after_id=lastRow.id)
+
+  return render_template('pages/shows.html', shows=dispList, next_page=nextPage)
 
 @app.route('/shows/create')
 def create_shows():
@@ -605,24 +790,23 @@ def create_shows():
 
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
-  error = False
+  form = ShowForm()
+  if not form.validate():
+    flash('Error occured. Show was not listed!')
+    return render_template('forms/new_show.html', form=form), 400
   try:
-    venue_id = request.form.get('venue_id')
-    venue = Venue.query.get(venue_id)
-    if venue is None:
-      return not_found_error(404)
-
-    artist_id = request.form.get('artist_id')
-    artist = Artist.query.get(artist_id)
-    if artist is None:
-      return not_found_error(404)
+    venueId = int(form.venue_id.data)
+    artistId = int(form.artist_id.data)
+  except (TypeError, ValueError):
+    return not_found_error(404)
 
-    start_time = "2019-05-21T21:30:00.000Z"
-    show = Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time)
-    # TODO: check for duplicates before adding
-    db.session.add(show)
-    db.session.commit()
-    flash('Show was successfully listed!')
+  error = False
+  try:
+    # one round trip: the insert itself checks the venue, the artist and
+    # that the venue is free, so concurrent bookings cannot both get a slot
+    status, showId = show_booking.book(venueId, artistId, form.start_time.data)
+    if status == BOOKED:
+      db.session.commit()
   except:
     error = True
     db.session.rollback()
@@ -630,15 +814,37 @@ def create_show_submission():
   finally:
     db.session.close()
     app.logger.info('New data for Show session closed')
-  
+
   if error:
     app.logger.info('Error occured in new show')
     flash('Error occured. Show was not listed!')
-  else:
-    flash('Show was successfully listed!')
-
+    return render_template('pages/home.html')
+  if status in (NO_VENUE, NO_ARTIST):
+    return not_found_error(404)
+  if status == DUPLICATE:
+    flash('This show is already listed.')
+    return render_template('pages/home.html'), 409
+  if status != BOOKED:
+    flash('The venue is already booked at that time. Show was not listed!')
+    return render_template('pages/home.html'), 409
+
+  # the insert bypasses the ORM, so drop what the caches hold for it here
+  venue_areas.invalidate()
+  invalidate_pages(Show, {'venue_id': venueId, 'artist_id': artistId})
+  flash('Show was successfully listed!')
   return render_template('pages/home.html')
 
+#  Debug
+#  ----------------------------------------------------------------
+
+@app.route('/_debug/cache')
+def debug_cache():
+  if not app.debug:
+    return not_found_error(404)
+  return jsonify({
+    "pages": page_cache.stats()
+  })
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -647,14 +853,17 @@ def not_found_error(error):
 def server_error(error):
     return render_template('errors/500.html'), 500
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+if app.config.get('ERROR_LOG', not app.debug):
+    # records are queued and formatted and written to error.log by a
+    # background thread
+    log_listener = queue_file_logging(
+        app.logger,
+        'error.log',
+        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'),
+        app.config.get('LOG_LEVEL', logging.INFO),
+        max_bytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backup_count=app.config.get('LOG_BACKUP_COUNT', 5)
     )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
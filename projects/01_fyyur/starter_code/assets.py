@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+# worth compressing; images and woff fonts are compressed already
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot', '.json', '.txt', '.html'}
+# a variant is only kept if it saves at least this share of the file
+MIN_SAVING = 0.1
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def fingerprinted_name(name, data):
+    stem, ext = posixpath.splitext(name)
+    return '{}.{}{}'.format(stem, hashlib.sha256(data).hexdigest()[:12], ext)
+
+
+def rewrite_css_urls(name, data, manifest, output):
+    '''Points relative url()s of a stylesheet at the fingerprinted files.'''
+    base = posixpath.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        path, sep, fragment = url.partition('?') if '?' in url else url.partition('#')
+        if ':' in path or path.startswith('/'):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(base, path))
+        if target not in manifest:
+            return match.group(0)
+        # the stylesheet itself moves to output/base
+        new = posixpath.relpath(manifest[target], posixpath.join(output, base))
+        return 'url({0}{1}{2}{3}{0})'.format(quote, new, sep, fragment)
+
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def write_variants(path, data):
+    '''Writes path.gz and, if brotli is installed, path.br next to path.'''
+    written = []
+    variants = [('.gz', lambda: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data)))
+    for suffix, compress in variants:
+        compressed = compress()
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(suffix)
+    return written
+
+
+def build(static_folder, output='dist', clean=False):
+    '''Copies every file under static_folder into static_folder/output
+    under a content-hashed name, with gzip and brotli variants, and writes
+    the manifest of source name -> fingerprinted name.
+
+    Stylesheets are handled last so their url()s can name the
+    fingerprinted fonts and images. Returns the manifest.
+    '''
+    out_dir = os.path.join(static_folder, output)
+    if clean and os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+
+    names = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != out_dir and not d.startswith('.')]
+        for file in files:
+            if not file.startswith('.'):
+                names.append(os.path.relpath(os.path.join(root, file), static_folder).replace(os.sep, '/'))
+    names.sort(key=lambda name: (name.endswith('.css'), name))
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            data = rewrite_css_urls(name, data, manifest, output)
+
+        target = posixpath.join(output, fingerprinted_name(name, data))
+        path = os.path.join(static_folder, target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if posixpath.splitext(name)[1].lower() in COMPRESSIBLE:
+            write_variants(path, data)
+        manifest[name] = target
+
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    '''Serves the output of `flask build-assets`.
+
+    url_for('static', filename=...) names the fingerprinted file when the
+    manifest has one, and the static route answers requests for those
+    files with the brotli or gzip variant the client accepts and headers
+    that let it cache them for a year without revalidating. Other static
+    files are served as before. Without a build nothing changes.
+    '''
+
+    def __init__(self, app, output='dist', max_age=365 * 24 * 3600):
+        self.app = app
+        self.output = output
+        self.max_age = max_age
+        self.manifest = {}
+        self.load()
+
+        self.send_static_file = app.view_functions['static']
+        app.view_functions['static'] = self.send
+        app.url_defaults(self.fingerprint)
+        app.extensions['assets'] = self
+        app.cli.add_command(build_assets)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.app.static_folder, self.output, MANIFEST)
+
+    def load(self):
+        try:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def fingerprint(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.manifest.get(values['filename'], values['filename'])
+
+    def send(self, filename):
+        if not filename.startswith(self.output + '/'):
+            return self.send_static_file(filename=filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        path = os.path.join(self.app.static_folder, *filename.split('/'))
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+                response = send_from_directory(
+                    self.app.static_folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.app.static_folder, filename, mimetype=mimetype)
+
+        response.headers['Vary'] = 'Accept-Encoding'
+        # the name changes whenever the content does
+        response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(self.max_age)
+        return response
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove earlier builds first.')
+@with_appcontext
+def build_assets(clean):
+    '''Fingerprints and precompresses everything under static/.'''
+    assets = current_app.extensions['assets']
+    manifest = build(current_app.static_folder, assets.output, clean)
+    assets.load()
+    click.echo('built {} assets into static/{}{}'.format(
+        len(manifest), assets.output,
+        '' if brotli is not None else ' (gzip only, install brotli for .br variants)'))
@@ -0,0 +1,65 @@
+'''Micro-benchmark of the `datetime` template filter.
+
+Compares the per-call cost of the original filter (dateutil parse plus
+babel.dates.format_datetime on every call) with DateTimeFormatter, for
+ISO strings and datetime objects, with the repetition of a show listing:
+`--calls` formats drawn from `--distinct` different show times.
+
+  $ python bench_datetime.py --calls 20000 --distinct 200
+'''
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from datefmt import DateTimeFormatter
+
+
+def original_format_datetime(value, format='medium'):
+    # the filter as it was in app.py
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def timed(label, format_datetime, values, baseline=None):
+    started = time.perf_counter()
+    for value in values:
+        format_datetime(value, 'full')
+    per_call = (time.perf_counter() - started) / len(values)
+    speedup = '' if baseline is None else '  {:.1f}x faster'.format(baseline / per_call)
+    print('{:<28} {:>9.2f} us per call{}'.format(label, per_call * 1e6, speedup))
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=200)
+    args = parser.parse_args()
+
+    base = datetime(2019, 5, 21, 21, 30)
+    times = [base + timedelta(hours=i) for i in range(args.distinct)]
+    objects = [random.choice(times) for _ in range(args.calls)]
+    strings = [value.isoformat() + '.000Z' for value in objects]
+
+    for value in times[:20]:
+        string = value.isoformat() + '.000Z'
+        assert DateTimeFormatter()(string, 'full') == original_format_datetime(string, 'full')
+        assert DateTimeFormatter()(value, 'medium') == original_format_datetime(value.isoformat(), 'medium')
+
+    baseline = timed('original, strings', original_format_datetime, strings)
+    timed('formatter, strings, cold', DateTimeFormatter(maxsize=0), strings, baseline)
+    timed('formatter, datetimes, cold', DateTimeFormatter(maxsize=0), objects, baseline)
+    timed('formatter, strings', DateTimeFormatter(), strings, baseline)
+    timed('formatter, datetimes', DateTimeFormatter(), objects, baseline)
+
+
+if __name__ == '__main__':
+    main()
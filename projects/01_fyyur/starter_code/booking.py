@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+from sqlalchemy import DDL, and_, bindparam, event, exists, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+# how long a show holds its venue; must match the interval of the
+# ex_show_venue_slot exclusion constraint in the show booking migration
+SHOW_LENGTH = timedelta(hours=2)
+
+BOOKED = 'booked'
+DUPLICATE = 'duplicate'
+OVERLAP = 'overlap'
+NO_VENUE = 'no venue'
+NO_ARTIST = 'no artist'
+
+
+def venue_slot_constraint(length):
+    '''Postgres DDL that keeps two shows of a venue from overlapping.'''
+    return [
+        'CREATE EXTENSION IF NOT EXISTS btree_gist',
+        'ALTER TABLE show ADD CONSTRAINT ex_show_venue_slot EXCLUDE USING gist '
+        "(venue_id WITH =, tsrange(start_time, start_time + interval '{} seconds') WITH &&) "
+        'WHERE (start_time IS NOT NULL)'.format(int(length.total_seconds()))
+    ]
+
+
+class ShowBooking:
+    '''Books a show with one INSERT ... SELECT whose WHERE clause checks
+    that the venue and the artist exist and that the venue has no other
+    show within SHOW_LENGTH of start_time.
+
+    Concurrent bookings of a slot are settled by the database. On Postgres
+    the insert is ON CONFLICT DO NOTHING against the unique constraint on
+    (venue_id, artist_id, start_time) and the ex_show_venue_slot exclusion
+    constraint, and the foreign keys catch a venue or artist deleted in the
+    meantime. SQLite takes its write lock before the SELECT runs, so the
+    checks cannot interleave, and INSERT OR IGNORE falls back on the unique
+    constraint. Only a refused booking costs a second query, to tell why.
+    '''
+
+    def __init__(self, db, show, venue, artist, length=SHOW_LENGTH):
+        self.db = db
+        self.table = show.__table__
+        self.venue = venue
+        self.artist = artist
+        self.length = length
+        # the migration adds the constraint to existing databases
+        for statement in venue_slot_constraint(length):
+            event.listen(self.table, 'after_create',
+                         DDL(statement).execute_if(dialect='postgresql'))
+
+    def parameters(self, venue_id, artist_id, start_time):
+        '''The values statement() is executed with. The slot bounds are
+        worked out here, SQLite cannot add an interval to a datetime.'''
+        return {
+            'booking_venue_id': venue_id,
+            'booking_artist_id': artist_id,
+            'booking_start_time': start_time,
+            'booking_slot_start': start_time - self.length,
+            'booking_slot_end': start_time + self.length
+        }
+
+    def statement(self, returning=True):
+        '''The booking INSERT, with bound parameters so that it can also
+        be executed for many rows at once (see importer.ShowImporter), in
+        which case there is nothing to return.'''
+        show = self.table.c
+        venue_id = bindparam('booking_venue_id', type_=show.venue_id.type)
+        artist_id = bindparam('booking_artist_id', type_=show.artist_id.type)
+        row = select([
+            venue_id,
+            artist_id,
+            bindparam('booking_start_time', type_=show.start_time.type)
+        ]).where(and_(
+            exists().where(self.venue.id == venue_id),
+            exists().where(self.artist.id == artist_id),
+            ~exists().where(and_(
+                show.venue_id == venue_id,
+                show.start_time > bindparam('booking_slot_start', type_=show.start_time.type),
+                show.start_time < bindparam('booking_slot_end', type_=show.start_time.type)
+            ))
+        ))
+        columns = ['venue_id', 'artist_id', 'start_time']
+
+        if self.db.engine.dialect.name == 'postgresql':
+            insert = postgresql.insert(self.table).from_select(columns, row) \
+                .on_conflict_do_nothing()
+            return insert.returning(show.id) if returning else insert
+        return self.table.insert().from_select(columns, row) \
+            .prefix_with('OR IGNORE', dialect='sqlite')
+
+    def book(self, venue_id, artist_id, start_time):
+        '''Returns (BOOKED, show id) or (why it was refused, None). The
+        caller commits; a refused booking may have rolled the session back.
+        '''
+        try:
+            result = self.db.session.execute(
+                self.statement(), self.parameters(venue_id, artist_id, start_time))
+        except IntegrityError:
+            # a foreign key, or a constraint this dialect cannot ignore
+            self.db.session.rollback()
+        else:
+            if result.returns_rows:
+                show_id = result.scalar()
+            else:
+                show_id = result.lastrowid if result.rowcount == 1 else None
+            if show_id is not None:
+                return BOOKED, show_id
+        return self.refusal(venue_id, artist_id, start_time), None
+
+    def refusal(self, venue_id, artist_id, start_time):
+        show = self.table.c
+        venue_found, artist_found, duplicate = self.db.session.query(
+            exists().where(self.venue.id == venue_id),
+            exists().where(self.artist.id == artist_id),
+            exists().where(and_(
+                show.venue_id == venue_id,
+                show.artist_id == artist_id,
+                show.start_time == start_time
+            ))
+        ).one()
+        if not venue_found:
+            return NO_VENUE
+        if not artist_found:
+            return NO_ARTIST
+        if duplicate:
+            return DUPLICATE
+        return OVERLAP
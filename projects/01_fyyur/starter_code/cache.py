@@ -0,0 +1,231 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+PENDING_KEY = 'fyyur_pending_invalidations'
+
+
+class CachedValue:
+    '''A single value built on demand and kept for at most `ttl` seconds.
+
+    invalidate() drops it so the next get() rebuilds it.
+    '''
+
+    def __init__(self, build, ttl=60):
+        self.build = build
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.value = None
+        self.expires_at = 0
+        self.generation = 0
+
+    def get(self):
+        with self.lock:
+            if time.monotonic() < self.expires_at:
+                return self.value
+            generation = self.generation
+
+        value = self.build()
+        with self.lock:
+            # an invalidation while building means the value may be stale
+            if generation == self.generation:
+                self.value = value
+                self.expires_at = time.monotonic() + self.ttl
+        return value
+
+    def invalidate(self, *args):
+        with self.lock:
+            self.generation += 1
+            self.value = None
+            self.expires_at = 0
+
+
+def invalidate_on_commit(models, invalidate):
+    '''Calls invalidate(model, values) once the transaction that inserted,
+    updated or deleted an instance of one of `models` has committed.
+
+    `values` maps the instance's column attributes to their values at flush
+    time, so they are still readable for a deleted instance. Invalidations
+    of a rolled back transaction are dropped.
+    '''
+    def touched(mapper, connection, target):
+        db_session = object_session(target)
+        if db_session is None:
+            return
+        values = {attr.key: getattr(target, attr.key) for attr in mapper.column_attrs}
+        db_session.info.setdefault(PENDING_KEY, []).append((invalidate, mapper.class_, values))
+
+    for model in models:
+        event.listen(model, 'after_insert', touched)
+        event.listen(model, 'after_update', touched)
+        event.listen(model, 'after_delete', touched)
+
+
+@event.listens_for(Session, 'after_commit')
+def run_pending_invalidations(db_session):
+    for invalidate, model, values in db_session.info.pop(PENDING_KEY, ()):
+        invalidate(model, values)
+
+
+@event.listens_for(Session, 'after_rollback')
+def drop_pending_invalidations(db_session):
+    db_session.info.pop(PENDING_KEY, None)
+
+
+class MemoryPageBackend:
+    '''In-process LRU of rendered pages, holding at most `max_entries`.'''
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, html = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                self.evictions += 1
+                return None
+            self.entries.move_to_end(key)
+            return html
+
+    def set(self, key, html, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, html)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def size(self):
+        return len(self.entries)
+
+
+class DiskPageBackend:
+    '''Rendered pages as files under `directory`, shared by every worker
+    process on the host. The first line of a file is its expiry time.'''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.html')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, encoding='utf-8') as page:
+                expires_at = float(page.readline())
+                html = page.read()
+        except (OSError, ValueError):
+            return None
+        if expires_at <= time.time():
+            self.delete(key)
+            self.evictions += 1
+            return None
+        return html
+
+    def set(self, key, html, ttl):
+        # write then rename, so a reader never sees a partial page
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as page:
+            page.write('{}\n'.format(time.time() + ttl))
+            page.write(html)
+        os.replace(tmp, self.path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def size(self):
+        return len([name for name in os.listdir(self.directory) if name.endswith('.html')])
+
+
+class PageCache:
+    '''Rendered HTML of detail pages, keyed by kind and entity id.'''
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        if config.get('PAGE_CACHE_BACKEND', 'memory') == 'disk':
+            backend = DiskPageBackend(config['PAGE_CACHE_DIR'])
+        else:
+            backend = MemoryPageBackend(config.get('PAGE_CACHE_SIZE', 1000))
+        return cls(backend, config.get('PAGE_CACHE_TTL', 300))
+
+    @staticmethod
+    def key(kind, id):
+        return '{}:{}'.format(kind, id)
+
+    def get(self, kind, id):
+        html = self.backend.get(self.key(kind, id))
+        if html is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return html
+
+    def set(self, kind, id, html):
+        self.backend.set(self.key(kind, id), html, self.ttl)
+
+    def invalidate(self, kind, id):
+        self.backend.delete(self.key(kind, id))
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'size': self.backend.size(),
+            'ttl': self.ttl
+        }
+
+    def cached(self, kind, id_arg):
+        '''Serves a view from the cache, keyed by its `id_arg` argument.
+
+        Only successful renders (plain strings) are stored, and requests
+        with pending flash messages bypass the cache in both directions.
+        '''
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if '_flashes' in session:
+                    return view(**kwargs)
+                id = kwargs[id_arg]
+                html = self.get(kind, id)
+                if html is not None:
+                    return html
+                response = view(**kwargs)
+                if isinstance(response, str):
+                    self.set(kind, id, response)
+                return response
+            return wrapper
+        return decorator
@@ -0,0 +1,49 @@
+from datetime import datetime
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+# the patterns behind the format names used in the templates
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# Babel's own named formats, which depend on the locale's data
+BABEL_FORMATS = ('long', 'short')
+
+
+class DateTimeFormatter:
+    '''The `datetime` template filter: formats a datetime, or a string
+    dateutil can parse, with a named or Babel pattern.
+
+    Patterns are compiled once per format and the locale is parsed once.
+    The last `maxsize` (value, format) results are kept, so a page listing
+    the same show times again and again formats each of them once.
+    '''
+
+    def __init__(self, locale=babel.dates.LC_TIME, maxsize=4096):
+        self.locale = Locale.parse(locale)
+        self.pattern = lru_cache(maxsize=None)(babel.dates.parse_pattern)
+        self.cached_format = lru_cache(maxsize=maxsize)(self.format)
+
+    def __call__(self, value, format='medium'):
+        try:
+            return self.cached_format(value, format)
+        except TypeError:
+            # an unhashable value
+            return self.format(value, format)
+
+    def format(self, value, format='medium'):
+        date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
+        if format in BABEL_FORMATS:
+            return babel.dates.format_datetime(date, format, locale=self.locale)
+        if date.tzinfo is None:
+            # as babel.dates.format_datetime does
+            date = date.replace(tzinfo=babel.dates.UTC)
+        return self.pattern(PATTERNS.get(format, format)).apply(date, self.locale)
+
+    def cache_info(self):
+        return self.cached_format.cache_info()
@@ -0,0 +1,214 @@
+import csv
+import json
+import time
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+# columns of a show row that reference a venue or an artist by name,
+# when the file does not carry their ids
+NAME_REFERENCES = {'venue_id': 'venue_name', 'artist_id': 'artist_name'}
+
+
+def read_rows(path):
+    '''Yields the rows of a .csv, .jsonl/.ndjson (streamed) or .json array file.'''
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as source:
+            for row in csv.DictReader(source):
+                if row.get('genres'):
+                    row['genres'] = [genre.strip() for genre in row['genres'].split(',')]
+                yield row
+    elif path.endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as source:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, encoding='utf-8') as source:
+            for row in json.load(source):
+                yield row
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def form_data(row):
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if isinstance(value, list):
+            data.setlist(key, [str(item) for item in value])
+        else:
+            data.add(key, str(value))
+    return data
+
+
+class Importer:
+    '''Validates rows with a form class and inserts them in batches.
+
+    One form instance is reused for every row, so validation costs a
+    process() and validate() call rather than building the form each time.
+    The rows of a batch go to the database as one executemany insert and
+    one commit. A batch the database refuses is rolled back and counted
+    as rejected; the import goes on with the next one.
+    '''
+
+    def __init__(self, db, model, form_class, columns):
+        self.db = db
+        self.table = model.__table__
+        self.form = form_class(formdata=None, meta={'csrf': False})
+        self.columns = columns
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def resolve(self, line, values):
+        return values
+
+    def reject(self, line, errors, count=1):
+        self.rejected += count
+        if len(self.errors) < 20:
+            self.errors.append((line, errors))
+
+    def validate(self, line, row):
+        self.form.process(form_data(row))
+        if not self.form.validate():
+            self.reject(line, self.form.errors)
+            return None
+        values = {column: self.form[column].data for column in self.columns}
+        return self.resolve(line, values)
+
+    def statement(self):
+        return self.table.insert()
+
+    def insert(self, values, lines):
+        if not values:
+            return
+        try:
+            result = self.db.session.execute(self.statement(), values)
+            self.db.session.commit()
+        except IntegrityError as error:
+            self.db.session.rollback()
+            self.reject(lines, {'batch': [str(error.orig).strip()]}, len(values))
+            return
+        # rowcount of an executemany is the total, or -1 if the driver cannot tell
+        inserted = len(values) if result.rowcount < 0 else result.rowcount
+        self.inserted += inserted
+        if inserted < len(values):
+            self.reject(lines, {'batch': ['{} of the rows conflict with existing ones.'.format(
+                len(values) - inserted)]}, len(values) - inserted)
+
+    def run(self, rows, batch_size):
+        line = 0
+        for chunk in chunks(rows, batch_size):
+            first = line + 1
+            values = []
+            for row in chunk:
+                line += 1
+                row = self.validate(line, row)
+                if row is not None:
+                    values.append(row)
+            self.insert(values, '{}-{}'.format(first, line))
+            yield line
+
+
+class ShowImporter(Importer):
+    '''Shows reference their venue and artist by id or by name. Both are
+    resolved against id maps loaded once, not one lookup per row.
+
+    Rows are inserted with the statement of the `booking` ShowBooking, so
+    shows already listed or overlapping at their venue, earlier in the
+    file or in the database, are skipped as they are for the show form.
+    '''
+
+    def __init__(self, db, model, form_class, columns, venue, artist, booking):
+        super().__init__(db, model, form_class, columns)
+        self.booking = booking
+        self.ids = {
+            'venue_id': set(id for id, in db.session.query(venue.id)),
+            'artist_id': set(id for id, in db.session.query(artist.id)),
+        }
+        self.names = {
+            'venue_id': dict(db.session.query(venue.name, venue.id)),
+            'artist_id': dict(db.session.query(artist.name, artist.id)),
+        }
+        self.touched = {'venue_id': set(), 'artist_id': set()}
+
+    def statement(self):
+        return self.booking.statement(returning=False)
+
+    def validate(self, line, row):
+        for key, name in NAME_REFERENCES.items():
+            if not row.get(key) and row.get(name) in self.names[key]:
+                row = dict(row, **{key: self.names[key][row[name]]})
+        return super().validate(line, row)
+
+    def resolve(self, line, values):
+        for key in ('venue_id', 'artist_id'):
+            try:
+                values[key] = int(values[key])
+            except (TypeError, ValueError):
+                values[key] = None
+            if values[key] not in self.ids[key]:
+                self.reject(line, {key: ['No such id.']})
+                return None
+        for key in ('venue_id', 'artist_id'):
+            self.touched[key].add(values[key])
+        return self.booking.parameters(values['venue_id'], values['artist_id'], values['start_time'])
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows validated and inserted per transaction.')
+@with_appcontext
+def import_data(kind, path, batch_size):
+    '''Bulk loads venues, artists or shows from a CSV or JSON file.'''
+    from app import db, Venue, Artist, Show, page_cache, searcher, show_booking, venue_areas
+    from forms import VenueForm, ArtistForm, ShowForm
+
+    if kind == 'venues':
+        importer = Importer(db, Venue, VenueForm, [
+            'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link', 'genres'])
+    elif kind == 'artists':
+        importer = Importer(db, Artist, ArtistForm, [
+            'name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'genres'])
+    else:
+        importer = ShowImporter(db, Show, ShowForm, [
+            'venue_id', 'artist_id', 'start_time'], Venue, Artist, show_booking)
+
+    started = time.monotonic()
+    for line in importer.run(read_rows(path), batch_size):
+        elapsed = time.monotonic() - started
+        click.echo('{} rows read, {} inserted, {:.0f} rows/s'.format(
+            line, importer.inserted, line / elapsed if elapsed else 0))
+
+    # the inserts bypass the ORM, so drop what the caches hold for them here
+    venue_areas.invalidate()
+    if kind == 'venues':
+        searcher.memory.reset(Venue)
+    elif kind == 'artists':
+        searcher.memory.reset(Artist)
+    else:
+        for id in importer.touched['venue_id']:
+            page_cache.invalidate('venue', id)
+        for id in importer.touched['artist_id']:
+            page_cache.invalidate('artist', id)
+
+    elapsed = time.monotonic() - started
+    click.echo('Imported {} {} in {:.1f}s ({:.0f} rows/s), {} rejected'.format(
+        importer.inserted, kind, elapsed,
+        importer.inserted / elapsed if elapsed else 0, importer.rejected))
+    for line, errors in importer.errors:
+        click.echo('  row {}: {}'.format(line, errors), err=True)
@@ -0,0 +1,117 @@
+import atexit
+import copy
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    '''RotatingFileHandler that leaves flushing to the writer thread.
+
+    emit() only writes into the file buffer; sync() pushes the buffer to
+    the OS and fsyncs it, at most once every `fsync_interval` seconds.
+    '''
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, fsync_interval=1.0, **kwargs):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, **kwargs)
+        self.fsync_interval = fsync_interval
+        self.last_fsync = 0
+
+    def flush(self):
+        # called by emit() after every record, the writer calls sync() instead
+        pass
+
+    def sync(self, force=False):
+        self.acquire()
+        try:
+            if self.stream is None:
+                return
+            self.stream.flush()
+            now = time.monotonic()
+            if force or now - self.last_fsync >= self.fsync_interval:
+                os.fsync(self.stream.fileno())
+                self.last_fsync = now
+        finally:
+            self.release()
+
+    def close(self):
+        self.sync(force=True)
+        super().close()
+
+
+class RawQueueHandler(QueueHandler):
+    '''QueueHandler that leaves formatting to the listener's handlers.
+
+    The stock prepare() formats every record in the logging thread. Here
+    the record is only made safe to read later: the message is merged
+    with its args, which may change or be released once the call
+    returns, and an exception is rendered to exc_text, so that the
+    traceback and the frames it holds are not kept alive in the queue.
+    '''
+
+    exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class BatchingQueueListener(QueueListener):
+    '''Writes queued records in a background thread, syncing the handlers
+    once per drained batch rather than once per record.'''
+
+    def dequeue(self, block):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            # the batch is written, sync before waiting for the next one
+            self.sync()
+            return self.queue.get(block)
+
+    def sync(self):
+        for handler in self.handlers:
+            if hasattr(handler, 'sync'):
+                handler.sync()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+def queue_file_logging(logger, filename, formatter, level,
+                       max_bytes=10 * 1024 * 1024, backup_count=5, fsync_interval=1.0):
+    '''Routes `logger` through a queue to a rotating file written by a
+    background thread, so logging calls never wait on disk I/O or on
+    `formatter`.
+
+    Returns the started listener; it is stopped at interpreter exit.
+    '''
+    file_handler = BatchedRotatingFileHandler(
+        filename,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        fsync_interval=fsync_interval,
+        delay=True
+    )
+    file_handler.setFormatter(formatter)
+    file_handler.setLevel(level)
+
+    records = queue.Queue(-1)
+    logger.setLevel(level)
+    logger.addHandler(RawQueueHandler(records))
+
+    listener = BatchingQueueListener(records, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
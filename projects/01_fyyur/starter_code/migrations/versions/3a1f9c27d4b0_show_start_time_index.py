@@ -0,0 +1,25 @@
+"""show start_time index
+
+Revision ID: 3a1f9c27d4b0
+Revises: ee5fc8bc5c28
+Create Date: 2026-10-18 13:45:10.512309
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a1f9c27d4b0'
+down_revision = 'ee5fc8bc5c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keyset pagination of /shows orders and seeks on (start_time, id)
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
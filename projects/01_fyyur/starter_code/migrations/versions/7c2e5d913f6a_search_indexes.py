@@ -0,0 +1,48 @@
+"""search indexes
+
+Revision ID: 7c2e5d913f6a
+Revises: 3a1f9c27d4b0
+Create Date: 2026-10-18 14:02:37.240115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e5d913f6a'
+down_revision = '3a1f9c27d4b0'
+branch_labels = None
+depends_on = None
+
+# same expression as search.search_document(), which the searches filter on
+SEARCH_DOCUMENT = (
+    "(COALESCE(name, '') || ' ' || COALESCE(city, '') || ' ' || "
+    "COALESCE(state, '') || ' ' || COALESCE(CAST(genres AS TEXT), ''))"
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        # other databases use the in-memory index in search.py
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venue', 'artist'):
+        op.execute(
+            'CREATE INDEX ix_{0}_search_trgm ON {0} '
+            'USING gin ({1} gin_trgm_ops)'.format(table, SEARCH_DOCUMENT)
+        )
+        op.create_index(
+            'ix_{}_state_city'.format(table), table,
+            ['state', sa.text('lower(city)')]
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in ('venue', 'artist'):
+        op.drop_index('ix_{}_state_city'.format(table), table_name=table)
+        op.drop_index('ix_{}_search_trgm'.format(table), table_name=table)
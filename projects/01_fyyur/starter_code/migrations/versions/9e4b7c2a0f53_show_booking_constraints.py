@@ -0,0 +1,73 @@
+"""show booking constraints
+
+Revision ID: 9e4b7c2a0f53
+Revises: d5f08a3c61e7
+Create Date: 2026-10-18 15:48:21.904712
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7c2a0f53'
+down_revision = 'd5f08a3c61e7'
+branch_labels = None
+depends_on = None
+
+# same as booking.SHOW_LENGTH
+SHOW_LENGTH = "interval '2 hours'"
+
+# the same show listed more than once
+DUPLICATES = (
+    'SELECT a.id, b.id FROM show a JOIN show b '
+    'ON a.venue_id = b.venue_id AND a.artist_id = b.artist_id '
+    'AND a.start_time = b.start_time AND a.id < b.id '
+    'LIMIT 20'
+)
+
+OVERLAPPING = (
+    'SELECT a.id, b.id FROM show a JOIN show b '
+    'ON a.venue_id = b.venue_id AND a.id < b.id '
+    'AND a.start_time > b.start_time - {0} AND a.start_time < b.start_time + {0} '
+    'LIMIT 20'.format(SHOW_LENGTH)
+)
+
+
+def check(query, problem):
+    # nothing is changed for the user; the rows are named so they can be
+    # fixed by hand before running the upgrade again
+    pairs = op.get_bind().execute(sa.text(query)).fetchall()
+    if pairs:
+        raise RuntimeError(
+            'these shows {}, delete or move one of each pair first: {}'.format(
+                problem, ', '.join('{}/{}'.format(*pair) for pair in pairs))
+        )
+
+
+def upgrade():
+    check(DUPLICATES, 'are listed twice')
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_show_venue_artist_start_time', ['venue_id', 'artist_id', 'start_time']
+        )
+
+    if op.get_bind().dialect.name != 'postgresql':
+        # other databases rely on the check in booking.ShowBooking
+        return
+
+    check(OVERLAPPING, 'overlap at their venue')
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute(
+        'ALTER TABLE show ADD CONSTRAINT ex_show_venue_slot EXCLUDE USING gist '
+        '(venue_id WITH =, tsrange(start_time, start_time + {}) WITH &&) '
+        'WHERE (start_time IS NOT NULL)'.format(SHOW_LENGTH)
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('ex_show_venue_slot', 'show')
+
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.drop_constraint('uq_show_venue_artist_start_time', type_='unique')
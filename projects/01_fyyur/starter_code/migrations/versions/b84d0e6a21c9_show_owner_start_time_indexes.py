@@ -0,0 +1,27 @@
+"""show owner start_time indexes
+
+Revision ID: b84d0e6a21c9
+Revises: 7c2e5d913f6a
+Create Date: 2026-10-18 14:31:52.870214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b84d0e6a21c9'
+down_revision = '7c2e5d913f6a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # venue and artist pages split their shows on start_time
+    op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
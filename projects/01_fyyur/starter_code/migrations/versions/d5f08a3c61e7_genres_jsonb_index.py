@@ -0,0 +1,52 @@
+"""genres jsonb index
+
+Revision ID: d5f08a3c61e7
+Revises: b84d0e6a21c9
+Create Date: 2026-10-18 15:12:06.518337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f08a3c61e7'
+down_revision = 'b84d0e6a21c9'
+branch_labels = None
+depends_on = None
+
+# every row ends up holding a JSON array of genre names: NULL becomes [],
+# a string holding a Postgres array literal such as "{Jazz,Folk}" is split,
+# and any other string becomes a one-genre list
+BACKFILL = (
+    "UPDATE {0} SET genres = CASE "
+    "WHEN genres IS NULL OR genres = 'null'::jsonb THEN '[]'::jsonb "
+    "WHEN jsonb_typeof(genres) = 'string' AND genres #>> '{{}}' LIKE '{{%}}' "
+    "THEN to_jsonb(string_to_array(trim(both '{{}}' from genres #>> '{{}}'), ',')) "
+    "ELSE jsonb_build_array(genres #>> '{{}}') END "
+    "WHERE genres IS NULL OR jsonb_typeof(genres) <> 'array'"
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        # other databases filter on the JSON text, see app.genre_filter
+        return
+
+    for table in ('venue', 'artist'):
+        # ix_<table>_search_trgm is rebuilt by the type change
+        op.execute('ALTER TABLE {0} ALTER COLUMN genres TYPE JSONB USING genres::jsonb'.format(table))
+        op.execute(BACKFILL.format(table))
+        op.create_index(
+            'ix_{}_genres'.format(table), table, ['genres'],
+            postgresql_using='gin', postgresql_ops={'genres': 'jsonb_path_ops'}
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in ('venue', 'artist'):
+        op.drop_index('ix_{}_genres'.format(table), table_name=table)
+        op.execute('ALTER TABLE {0} ALTER COLUMN genres TYPE JSON USING genres::json'.format(table))
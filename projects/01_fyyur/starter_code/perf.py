@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class Profiler:
+    '''Opt-in per-request instrumentation.
+
+    Records the number and total time of the SQL statements, the template
+    render time and the wall time of every request into a ring buffer,
+    reports them in a Server-Timing header and serves a summary per
+    endpoint at /_perf. A request that runs the same statement more than
+    `n_plus_one_threshold` times is flagged as a likely N+1 pattern.
+    '''
+
+    def __init__(self, app=None, size=500, n_plus_one_threshold=10):
+        self.size = size
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.records = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.logger = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.records = deque(maxlen=app.config.get('PERF_BUFFER_SIZE', self.size))
+        self.n_plus_one_threshold = app.config.get(
+            'PERF_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        self.logger = app.logger
+
+        event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+        # Flask's template signals would need blinker, which Fyyur does not
+        # install; the templates' own render() is timed instead
+        app.jinja_env.template_class = self.timed_template_class(app.jinja_env.template_class)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/_perf', 'perf', self.report)
+
+    # SQL
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'perf' in g:
+            conn.info.setdefault('perf_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'perf' in g and conn.info.get('perf_started'):
+            elapsed = time.perf_counter() - conn.info['perf_started'].pop()
+            g.perf['db'] += elapsed
+            g.perf['statements'][statement] += 1
+
+    # templates
+
+    def timed_template_class(self, base):
+        profiler = self
+
+        class TimedTemplate(base):
+            def render(self, *args, **kwargs):
+                if not profiler.before_render():
+                    return super().render(*args, **kwargs)
+                try:
+                    return super().render(*args, **kwargs)
+                finally:
+                    profiler.after_render()
+
+        return TimedTemplate
+
+    def before_render(self):
+        # only the outermost render is timed, a template rendered from
+        # inside another one is part of its time
+        if not has_request_context() or 'perf' not in g or g.perf['render_started'] is not None:
+            return False
+        g.perf['render_started'] = time.perf_counter()
+        return True
+
+    def after_render(self):
+        if 'perf' in g and g.perf['render_started'] is not None:
+            g.perf['render'] += time.perf_counter() - g.perf['render_started']
+            g.perf['render_started'] = None
+
+    # requests
+
+    def before_request(self):
+        g.perf = {
+            'started': time.perf_counter(),
+            'db': 0.0,
+            'render': 0.0,
+            'render_started': None,
+            'statements': Counter(),
+        }
+
+    def after_request(self, response):
+        perf = g.pop('perf', None)
+        if perf is None or request.endpoint == 'perf':
+            return response
+
+        total = time.perf_counter() - perf['started']
+        queries = sum(perf['statements'].values())
+        repeated = [
+            {'statement': statement, 'count': count}
+            for statement, count in perf['statements'].items()
+            if count > self.n_plus_one_threshold
+        ]
+        record = {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': total * 1000,
+            'db_ms': perf['db'] * 1000,
+            'render_ms': perf['render'] * 1000,
+            'queries': queries,
+            'n_plus_one': repeated,
+        }
+        with self.lock:
+            self.records.append(record)
+
+        if repeated:
+            self.logger.warning(
+                'possible N+1 in %s: %s', request.endpoint,
+                ', '.join('{count}x {statement}'.format(**item) for item in repeated))
+
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(
+            record['db_ms'], queries))
+        response.headers.add('Server-Timing', 'render;dur={:.2f}'.format(record['render_ms']))
+        response.headers.add('Server-Timing', 'total;dur={:.2f}'.format(record['total_ms']))
+        return response
+
+    def summary(self):
+        with self.lock:
+            records = list(self.records)
+
+        endpoints = {}
+        for record in records:
+            stats = endpoints.setdefault(record['endpoint'], {
+                'requests': 0,
+                'total_ms': 0.0,
+                'db_ms': 0.0,
+                'render_ms': 0.0,
+                'queries': 0,
+                'max_queries': 0,
+                'n_plus_one': 0,
+            })
+            stats['requests'] += 1
+            stats['total_ms'] += record['total_ms']
+            stats['db_ms'] += record['db_ms']
+            stats['render_ms'] += record['render_ms']
+            stats['queries'] += record['queries']
+            stats['max_queries'] = max(stats['max_queries'], record['queries'])
+            stats['n_plus_one'] += 1 if record['n_plus_one'] else 0
+
+        for stats in endpoints.values():
+            requests = stats['requests']
+            for key in ('total_ms', 'db_ms', 'render_ms', 'queries'):
+                stats['avg_' + key] = stats.pop(key) / requests
+        return endpoints, records
+
+    def report(self):
+        endpoints, records = self.summary()
+        return jsonify({
+            'endpoints': endpoints,
+            'recent': records[-50:],
+        })
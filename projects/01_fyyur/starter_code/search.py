@@ -0,0 +1,258 @@
+import json
+import re
+import threading
+
+from sqlalchemy import Text, cast, event, func
+from sqlalchemy.orm import Session, object_session
+
+# session.info key of the index changes waiting for their transaction to commit
+PENDING_KEY = 'fyyur_pending_search_changes'
+
+# "San Francisco, CA" searches by city and state instead of by substring
+CITY_STATE = re.compile(r'^\s*(?P<city>[^,]+?)\s*,\s*(?P<state>[A-Za-z]{2})\s*$')
+
+
+def parse_city_state(term):
+    match = CITY_STATE.match(term)
+    if match is None:
+        return None
+    return match.group('city').lower(), match.group('state').upper()
+
+
+def search_document(model):
+    # must stay identical to the expression indexed by the search migration,
+    # otherwise Postgres cannot use the trigram index for it
+    return (
+        func.coalesce(model.name, '') + ' ' +
+        func.coalesce(model.city, '') + ' ' +
+        func.coalesce(model.state, '') + ' ' +
+        func.coalesce(cast(model.genres, Text), '')
+    )
+
+
+def memory_document(name, city, state, genres):
+    # what search_document() evaluates to on Postgres, where CAST(genres AS
+    # TEXT) of a jsonb array reads '["Jazz", "Blues"]', so that both
+    # backends match the same terms (a search for 'z"' included)
+    genres_text = '' if genres is None else json.dumps(genres, ensure_ascii=False)
+    return ' '.join([name or '', city or '', state or '', genres_text])
+
+
+def like_pattern(term):
+    # backslash is the default LIKE escape character in Postgres
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%{}%'.format(escaped)
+
+
+def trigrams(text):
+    # pg_trgm style: every word padded with two spaces before and one after
+    grams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        padded = '  ' + word + ' '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(a, b):
+    # same measure as pg_trgm's similarity(), used to rank in memory
+    grams_a = trigrams(a)
+    grams_b = trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class PostgresSearchBackend:
+    '''Searches with ILIKE over search_document(), served by the pg_trgm
+    GIN index, and ranks matches by trigram similarity to the name.'''
+
+    def __init__(self, db):
+        self.db = db
+
+    def search(self, model, term, page, per_page):
+        query = self.db.session.query(model.id)
+        city_state = parse_city_state(term)
+        if city_state is not None:
+            city, state = city_state
+            query = query \
+                .filter(model.state == state, func.lower(model.city) == city) \
+                .order_by(model.name, model.id)
+        else:
+            query = query \
+                .filter(search_document(model).ilike(like_pattern(term))) \
+                .order_by(func.similarity(model.name, term).desc(), model.name, model.id)
+
+        total = query.order_by(None).count()
+        rows = query.limit(per_page).offset((page - 1) * per_page).all()
+        return total, [row.id for row in rows]
+
+
+class TrigramIndex:
+    '''In-memory inverted index from the substrings of up to three characters
+    of the search document to ids.
+
+    A substring search only verifies the ids present in the posting lists of
+    every trigram of the term, so it does not touch the rest of the table.
+    The posting list of a shorter term is its exact answer.
+    '''
+
+    def __init__(self):
+        self.documents = {}
+        self.names = {}
+        self.postings = {}
+        self.places = {}
+        self.place_of = {}
+
+    @staticmethod
+    def grams(text, sizes=(1, 2, 3)):
+        return {text[i:i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+    def add(self, id, name, city, state, genres):
+        self.remove(id)
+        document = memory_document(name, city, state, genres).lower()
+        self.documents[id] = document
+        self.names[id] = name or ''
+        for gram in self.grams(document):
+            self.postings.setdefault(gram, set()).add(id)
+
+        place = ((city or '').lower(), (state or '').upper())
+        self.place_of[id] = place
+        self.places.setdefault(place, set()).add(id)
+
+    def remove(self, id):
+        document = self.documents.pop(id, None)
+        if document is None:
+            return
+        self.names.pop(id)
+        for gram in self.grams(document):
+            ids = self.postings[gram]
+            ids.discard(id)
+            if not ids:
+                del self.postings[gram]
+
+        place = self.place_of.pop(id)
+        self.places[place].discard(id)
+        if not self.places[place]:
+            del self.places[place]
+
+    def search(self, term):
+        city_state = parse_city_state(term)
+        if city_state is not None:
+            ids = self.places.get(city_state, ())
+            return sorted(ids, key=lambda id: (self.names[id], id))
+
+        needle = term.lower()
+        if not needle:
+            candidates = self.documents.keys()
+        elif len(needle) < 3:
+            candidates = self.postings.get(needle, ())
+        else:
+            grams = self.grams(needle, sizes=(3,))
+            posting_lists = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set.intersection(*posting_lists)
+
+        ids = [id for id in candidates if needle in self.documents[id]]
+        return sorted(ids, key=lambda id: (-similarity(self.names[id], term), self.names[id], id))
+
+
+class MemorySearchBackend:
+    '''Fallback for databases without pg_trgm, e.g. SQLite in test runs.
+
+    Each model's index is loaded on its first search and then kept current
+    from the mapper insert/update/delete events, applied once their
+    transaction has committed.
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def index_for(self, model):
+        with self.lock:
+            index = self.indexes.get(model)
+            if index is None:
+                index = TrigramIndex()
+                rows = self.db.session.query(
+                    model.id, model.name, model.city, model.state, model.genres)
+                for row in rows:
+                    index.add(*row)
+                self.indexes[model] = index
+            return index
+
+    def changed(self, model, row):
+        with self.lock:
+            index = self.indexes.get(model)
+            if index is not None:
+                index.add(*row)
+
+    def deleted(self, model, id):
+        with self.lock:
+            index = self.indexes.get(model)
+            if index is not None:
+                index.remove(id)
+
+    def reset(self, model):
+        # reloaded on the next search, for rows written around the ORM
+        with self.lock:
+            self.indexes.pop(model, None)
+
+    def search(self, model, term, page, per_page):
+        index = self.index_for(model)
+        with self.lock:
+            ids = index.search(term)
+        start = (page - 1) * per_page
+        return len(ids), ids[start:start + per_page]
+
+
+class Search:
+    '''Name, city/state and genre search for the given models.
+
+    search() returns the total number of matches and the ids on the
+    requested page, best match first. The backend is picked from the
+    database dialect the first time it is needed.
+    '''
+
+    def __init__(self, db, models):
+        self.db = db
+        self.backend = None
+        self.memory = MemorySearchBackend(db)
+        for model in models:
+            self.watch(model)
+        event.listen(Session, 'after_commit', self.apply_pending)
+        event.listen(Session, 'after_rollback', self.drop_pending)
+
+    def watch(self, model):
+        # the events fire at flush; the values are read now, while the
+        # instance is loaded, and reach the index only if the flush commits
+        def pending(target, change):
+            db_session = object_session(target)
+            if db_session is not None:
+                db_session.info.setdefault(PENDING_KEY, []).append(change)
+
+        def changed(mapper, connection, target):
+            row = (target.id, target.name, target.city, target.state, target.genres)
+            pending(target, (self.memory.changed, model, row))
+
+        def deleted(mapper, connection, target):
+            pending(target, (self.memory.deleted, model, target.id))
+
+        event.listen(model, 'after_insert', changed)
+        event.listen(model, 'after_update', changed)
+        event.listen(model, 'after_delete', deleted)
+
+    def apply_pending(self, db_session):
+        for apply, model, change in db_session.info.pop(PENDING_KEY, ()):
+            apply(model, change)
+
+    def drop_pending(self, db_session):
+        db_session.info.pop(PENDING_KEY, None)
+
+    def search(self, model, term, page=1, per_page=20):
+        if self.backend is None:
+            if self.db.engine.dialect.name == 'postgresql':
+                self.backend = PostgresSearchBackend(self.db)
+            else:
+                self.backend = self.memory
+        return self.backend.search(model, term.strip(), max(page, 1), per_page)
@@ -0,0 +1,221 @@
+import os
+import re
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+# app.py reads its database from config.py, which reads DATABASE_URL
+TEST_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = os.environ.get(
+    'FYYUR_TEST_DATABASE_URL', 'sqlite:///' + os.path.join(TEST_DIR, 'fyyur_test.db'))
+
+from app import app, db, Venue, Artist, Show
+from booking import SHOW_LENGTH
+
+
+class ShowsTestCase(unittest.TestCase):
+    """Two venues and eight artists, no shows"""
+
+    def setUp(self):
+        self.start_time = datetime(2035, 5, 21, 21, 30)
+        # the form's CSRF token is checked in test_400_book_show_without_csrf_token
+        app.config['WTF_CSRF_ENABLED'] = False
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Venue(name='Venue %d' % i, genres=[]) for i in range(2)])
+            db.session.add_all([Artist(name='Artist %d' % i, genres=[]) for i in range(8)])
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def book(self, venue_id, artist_id, start_time, client=None):
+        client = client or app.test_client()
+        return client.post('/shows/create', data={
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    def shows(self):
+        with app.app_context():
+            return [(show.venue_id, show.artist_id, show.start_time) for show in Show.query.order_by(Show.id)]
+
+
+class ShowBookingTestCase(ShowsTestCase):
+    """Booking shows through POST /shows/create"""
+
+    def book_in_parallel(self, bookings):
+        """Posts every (venue_id, artist_id, start_time) at once, one thread each"""
+        barrier = threading.Barrier(len(bookings))
+        statuses = [None] * len(bookings)
+
+        def post(i, booking):
+            client = app.test_client()
+            barrier.wait()
+            statuses[i] = self.book(*booking, client=client).status_code
+
+        threads = [threading.Thread(target=post, args=(i, booking)) for i, booking in enumerate(bookings)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_book_show(self):
+        res = self.book(1, 1, self.start_time)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.shows(), [(1, 1, self.start_time)])
+
+    def test_book_show_uses_submitted_start_time(self):
+        later = self.start_time + timedelta(days=3)
+        self.book(1, 1, later)
+
+        self.assertEqual(self.shows(), [(1, 1, later)])
+
+    def test_400_book_show_invalid_start_time(self):
+        res = app.test_client().post('/shows/create', data={
+            'venue_id': 1, 'artist_id': 1, 'start_time': 'next friday'})
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.shows(), [])
+
+    def test_400_book_show_without_start_time(self):
+        res = app.test_client().post('/shows/create', data={'venue_id': 1, 'artist_id': 1})
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.shows(), [])
+
+    def test_400_book_show_without_csrf_token(self):
+        app.config['WTF_CSRF_ENABLED'] = True
+        client = app.test_client()
+        res = self.book(1, 1, self.start_time, client=client)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.shows(), [])
+
+        page = client.get('/shows/create').get_data(as_text=True)
+        token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+        res = client.post('/shows/create', data={
+            'csrf_token': token,
+            'venue_id': 1,
+            'artist_id': 1,
+            'start_time': self.start_time.strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.shows(), [(1, 1, self.start_time)])
+
+    def test_404_book_show_unknown_venue(self):
+        res = self.book(1000, 1, self.start_time)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(self.shows(), [])
+
+    def test_404_book_show_unknown_artist(self):
+        res = self.book(1, 1000, self.start_time)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(self.shows(), [])
+
+    def test_409_book_duplicate_show(self):
+        self.book(1, 1, self.start_time)
+        res = self.book(1, 1, self.start_time)
+
+        self.assertEqual(res.status_code, 409)
+        self.assertIn(b'already listed', res.data)
+        self.assertEqual(len(self.shows()), 1)
+
+    def test_409_book_overlapping_show(self):
+        self.book(1, 1, self.start_time)
+        res = self.book(1, 2, self.start_time + SHOW_LENGTH / 2)
+
+        self.assertEqual(res.status_code, 409)
+        self.assertIn(b'already booked', res.data)
+        self.assertEqual(len(self.shows()), 1)
+
+    def test_book_adjacent_and_other_venue_shows(self):
+        statuses = [
+            self.book(1, 1, self.start_time).status_code,
+            self.book(1, 2, self.start_time + SHOW_LENGTH).status_code,
+            self.book(2, 3, self.start_time).status_code
+        ]
+
+        self.assertEqual(statuses, [200, 200, 200])
+        self.assertEqual(len(self.shows()), 3)
+
+    def test_parallel_duplicate_bookings(self):
+        statuses = self.book_in_parallel([(1, 1, self.start_time)] * 8)
+
+        self.assertEqual(sorted(statuses), [200] + [409] * 7)
+        self.assertEqual(self.shows(), [(1, 1, self.start_time)])
+
+    def test_parallel_overlapping_bookings(self):
+        # eight artists after the same evening at venue 1
+        statuses = self.book_in_parallel([
+            (1, artist_id, self.start_time + timedelta(minutes=10 * artist_id))
+            for artist_id in range(1, 9)
+        ])
+
+        self.assertEqual(sorted(statuses), [200] + [409] * 7)
+        self.assertEqual(len(self.shows()), 1)
+
+    def test_parallel_bookings_of_different_venues(self):
+        statuses = self.book_in_parallel([(1, 1, self.start_time), (2, 2, self.start_time)])
+
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(len(self.shows()), 2)
+
+
+class ShowImportTestCase(ShowsTestCase):
+    """flask import-data shows applies the same checks as the show form"""
+
+    def import_shows(self, rows):
+        path = os.path.join(TEST_DIR, 'shows.csv')
+        with open(path, 'w') as f:
+            f.write('venue_id,artist_id,start_time\n')
+            for venue_id, artist_id, start_time in rows:
+                f.write('{},{},{}\n'.format(venue_id, artist_id, start_time.strftime('%Y-%m-%d %H:%M:%S')))
+        return app.test_cli_runner().invoke(args=['import-data', 'shows', path, '--batch-size', '2'])
+
+    def test_import_shows(self):
+        res = self.import_shows([(1, 1, self.start_time), (2, 2, self.start_time)])
+
+        self.assertEqual(res.exit_code, 0)
+        self.assertIn('Imported 2 shows', res.output)
+        self.assertEqual(len(self.shows()), 2)
+
+    def test_import_skips_duplicate_and_overlapping_shows(self):
+        self.book(2, 5, self.start_time)
+        res = self.import_shows([
+            (1, 1, self.start_time),
+            (1, 1, self.start_time),
+            (1, 2, self.start_time + timedelta(minutes=30)),
+            (1, 3, self.start_time + SHOW_LENGTH),
+            (2, 4, self.start_time + timedelta(hours=1))
+        ])
+
+        self.assertEqual(res.exit_code, 0)
+        self.assertIn('Imported 2 shows', res.output)
+        self.assertIn('3 rejected', res.output)
+        self.assertEqual(self.shows(), [
+            (2, 5, self.start_time),
+            (1, 1, self.start_time),
+            (1, 3, self.start_time + SHOW_LENGTH)
+        ])
+
+    def test_import_rejects_unknown_venue(self):
+        res = self.import_shows([(1000, 1, self.start_time)])
+
+        self.assertIn('1 rejected', res.output)
+        self.assertEqual(self.shows(), [])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+'''
+Benchmark of quiz question selection.
+
+Compares, for one quiz step with `previous` questions already answered:
+  naive    load every question of the category, filter in Python, random.choice
+  random   ORDER BY random() LIMIT 1 with a NOT IN filter, in the database
+  sampler  QuizSampler: O(k) pick from the in-memory id pool, fetch one row
+
+Usage:
+  python bench_quiz.py [--questions 1000000] [--categories 6] [--previous 20] [--rounds 5]
+
+Builds a throwaway SQLite database (bench_quiz.db) unless --database is given.
+The questions table of that database is dropped and rebuilt, so a database
+that already holds questions is refused unless --force is passed as well.
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+from flask import Flask
+from sqlalchemy import func
+
+from models import setup_db, db, Question
+from flaskr.quiz import QuizSampler
+
+
+def has_questions():
+  if not db.engine.has_table(Question.__tablename__):
+    return False
+  return db.session.query(Question.id).first() is not None
+
+
+def build(count, categories):
+  db.drop_all()
+  db.create_all()
+  batch = []
+  for i in range(count):
+    batch.append({
+      'question': 'Question {}?'.format(i),
+      'answer': 'Answer {}'.format(i),
+      'category': str(1 + i % categories),
+      'difficulty': 1 + i % 5
+    })
+    if len(batch) == 50000:
+      db.session.execute(Question.__table__.insert(), batch)
+      batch = []
+  if batch:
+    db.session.execute(Question.__table__.insert(), batch)
+  db.session.commit()
+
+
+def naive(category, previous):
+  questions = Question.query.filter(Question.category == category).all()
+  remaining = [question for question in questions if question.id not in previous]
+  return random.choice(remaining) if remaining else None
+
+
+def order_by_random(category, previous):
+  return Question.query \
+    .filter(Question.category == category, ~Question.id.in_(previous)) \
+    .order_by(func.random()) \
+    .first()
+
+
+def timed(label, pick, rounds, category, previous):
+  db.session.expunge_all()
+  started = time.perf_counter()
+  for _ in range(rounds):
+    pick(category, previous)
+    db.session.expunge_all()
+  per_call = (time.perf_counter() - started) / rounds
+  print('{:<8} {:>10.3f} ms per question'.format(label, per_call * 1000))
+  return per_call
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+  parser.add_argument('--questions', type=int, default=1000000)
+  parser.add_argument('--categories', type=int, default=6)
+  parser.add_argument('--previous', type=int, default=20)
+  parser.add_argument('--rounds', type=int, default=5)
+  parser.add_argument('--database', default=None)
+  parser.add_argument('--force', action='store_true',
+                      help='rebuild --database even if it already has questions')
+  args = parser.parse_args()
+
+  path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_quiz.db')
+  app = Flask(__name__)
+  setup_db(app, args.database or 'sqlite:///{}'.format(path))
+
+  with app.app_context():
+    if args.database is not None and not args.force and has_questions():
+      sys.exit('{} already has questions and would be dropped; '
+               'pass --force to rebuild it anyway'.format(args.database))
+    started = time.perf_counter()
+    build(args.questions, args.categories)
+    print('built {} questions in {:.1f}s'.format(args.questions, time.perf_counter() - started))
+
+    category = '1'
+    previous = set(id for id, in db.session.query(Question.id)
+                   .filter(Question.category == category).limit(args.previous))
+
+    sampler = QuizSampler()
+    started = time.perf_counter()
+    sampler.load()
+    print('sampler loaded in {:.1f}s (once per process and ttl)'.format(time.perf_counter() - started))
+
+    baseline = timed('naive', naive, args.rounds, category, previous)
+    timed('random', order_by_random, args.rounds, category, previous)
+    fast = timed('sampler', sampler.next_question, args.rounds * 100, category, previous)
+    print('sampler is {:.0f}x faster than naive'.format(baseline / fast))
+
+  if args.database is None:
+    os.remove(path)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,178 @@
+'''
+Connection pool settings, metrics and health routes shared by the Fyyur,
+trivia, coffee shop and capstone backends.
+
+projects/shared/db_pool.py is the only copy to edit. Each project deploys
+on its own, so `python shared/vendor.py` (run from projects/) copies it
+into them, and `python shared/vendor.py --check` fails if a copy drifted.
+'''
+import os
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+# /healthz reports unhealthy for this long after a checkout timed out
+RECENT_TIMEOUT_SECONDS = 60
+
+
+def engine_options(database_uri, environ=os.environ):
+    '''
+    SQLALCHEMY_ENGINE_OPTIONS for a server database, read from:
+        DB_POOL_SIZE             connections kept open (5)
+        DB_MAX_OVERFLOW          extra connections under load (10)
+        DB_POOL_TIMEOUT          seconds to wait for a free connection (30)
+        DB_POOL_PRE_PING         1 to test connections on checkout (1)
+        DB_POOL_RECYCLE          seconds before a connection is replaced (1800)
+        DB_STATEMENT_TIMEOUT_MS  Postgres statement_timeout, 0 for none (0)
+    SQLite keeps SQLAlchemy's own pooling.
+    '''
+    if database_uri.startswith('sqlite'):
+        return {}
+
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800))
+    }
+    statement_timeout = int(environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout and database_uri.startswith('postgres'):
+        options['connect_args'] = {'options': '-c statement_timeout={}'.format(statement_timeout)}
+    return options
+
+
+class PoolMetrics:
+    '''
+    Counters for one pool: checkouts and their wait, checkouts that found
+    every connection in use (exhausted_waits), connections opened and
+    checkouts that gave up waiting (timeouts).
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.exhausted_waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.connections_opened = 0
+        self.timeouts = 0
+        self.last_timeout_at = None
+
+    def checked_out(self, wait):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+    def found_exhausted(self):
+        with self.lock:
+            self.exhausted_waits += 1
+
+    def opened(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def timed_out(self):
+        with self.lock:
+            self.timeouts += 1
+            self.last_timeout_at = time.monotonic()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_wait_seconds_total': self.wait_seconds_total,
+                'checkout_wait_seconds_max': self.wait_seconds_max,
+                'exhausted_waits': self.exhausted_waits,
+                'connections_opened': self.connections_opened,
+                'timeouts': self.timeouts,
+                'last_timeout_at': self.last_timeout_at
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    '''QueuePool that times every checkout and counts waits, new connections and timeouts.'''
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kwargs):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+        # negative for no limit, as QueuePool takes it
+        self.max_overflow = max_overflow
+        self.metrics = PoolMetrics()
+
+    @property
+    def capacity(self):
+        '''Most connections the pool hands out at once, None without a limit.'''
+        if self.max_overflow < 0:
+            return None
+        return self.size() + self.max_overflow
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        capacity = self.capacity
+        if capacity is not None and self.checkedout() >= capacity:
+            # every connection is in use, this checkout waits for one back
+            self.metrics.found_exhausted()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            self.metrics.timed_out()
+            raise
+        self.metrics.checked_out(time.perf_counter() - started)
+        return connection
+
+    def _create_connection(self):
+        self.metrics.opened()
+        return super()._create_connection()
+
+
+def pool_status(pool):
+    '''Occupancy and metrics of the pool, read without touching the database.'''
+    if not isinstance(pool, MeteredQueuePool):
+        return {'pool': type(pool).__name__, 'healthy': True}
+
+    checked_out = pool.checkedout()
+    capacity = pool.capacity
+    metrics = pool.metrics.snapshot()
+    last_timeout_at = metrics.pop('last_timeout_at')
+    recent_timeout = last_timeout_at is not None and \
+        time.monotonic() - last_timeout_at < RECENT_TIMEOUT_SECONDS
+    metrics.update({
+        'pool': type(pool).__name__,
+        'size': pool.size(),
+        'capacity': capacity if capacity is not None else -1,
+        'checked_out': checked_out,
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'exhausted': capacity is not None and checked_out >= capacity,
+        'healthy': not recent_timeout
+    })
+    return metrics
+
+
+def register_health_routes(app, db):
+    '''
+    Adds /healthz (pool status as JSON, 503 after a recent checkout timeout)
+    and /metrics (the same numbers in the Prometheus text format). Neither
+    opens a database connection.
+    '''
+    @app.route('/healthz')
+    def healthz():
+        status = pool_status(db.engine.pool)
+        return jsonify(dict(status, success=status['healthy'])), 200 if status['healthy'] else 503
+
+    @app.route('/metrics')
+    def metrics():
+        status = pool_status(db.engine.pool)
+        lines = []
+        for name, value in sorted(status.items()):
+            if isinstance(value, (bool, int, float)):
+                lines.append('db_pool_{} {}'.format(name, float(value)))
+        return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4'}
@@ -1,26 +1,69 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, Response, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+from sqlalchemy.exc import SQLAlchemyError
 
-QUESTIONS_PER_PAGE = 10
-def paginate_books(request, selection):
-  page = request.args.get('page', 1, type=int)
-  start =  (page - 1) * QUESTIONS_PER_PAGE
-  end = start + QUESTIONS_PER_PAGE
+from models import setup_db, db, Question, Category
+from . import batch
+from .categories import CategoryRegistry
+from .pagination import CountCache, page_args, paginate
+from .quiz import ALL_CATEGORIES, QuizSampler
+from .quiz_sessions import MAX_ID, MemoryQuizSessionStore, SqliteQuizSessionStore
+from .search import QuestionSearch
 
-  questions = [question.format() for question in selection]
-  current_questions = questions[start:end]
+QUESTIONS_PER_PAGE = 10
+QUIZ_SESSION_TTL = int(os.environ.get('QUIZ_SESSION_TTL', 3600))
+ADMIN_TOKEN = os.environ.get('TRIVIA_ADMIN_TOKEN')
 
-  return current_questions
+def paginate_questions(request, query, counts, count_key):
+  '''
+  One page of `query` as formatted questions, paginated in the database.
+  Takes page, per_page (default QUESTIONS_PER_PAGE) and cursor from the query string.
+  '''
+  page, per_page, cursor = page_args(request, QUESTIONS_PER_PAGE)
+  questions, total, next_cursor = paginate(
+    query, Question.id, page, per_page, cursor, counts, count_key)
+  return [question.format() for question in questions], total, next_cursor
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
+  if test_config is None:
+    setup_db(app)
+  else:
+    setup_db(app, test_config['database_path'])
+
+  config = test_config or {}
+
+  # categories and the /categories body, read once; see invalidate_categories
+  category_registry = CategoryRegistry()
+  with app.app_context():
+    category_registry.load()
+  app.category_registry = category_registry
+
+  # cached COUNT(*) of the paginated listings
+  question_counts = CountCache()
+  app.question_counts = question_counts
+
+  # substring search over question text
+  question_search = QuestionSearch()
+  app.question_search = question_search
+
+  # per-category question id pools for the quiz
+  quiz_sampler = QuizSampler()
+  app.quiz_sampler = quiz_sampler
+
+  # server-side seen questions for quiz sessions, in memory unless a
+  # SQLite file is configured
+  session_database = config.get('quiz_session_database', os.environ.get('QUIZ_SESSION_DATABASE'))
+  if session_database:
+    quiz_sessions = SqliteQuizSessionStore(session_database, QUIZ_SESSION_TTL)
+  else:
+    quiz_sessions = MemoryQuizSessionStore(QUIZ_SESSION_TTL)
+  app.quiz_sessions = quiz_sessions
   
   '''
   @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -43,15 +86,31 @@ def create_app(test_config=None):
   '''
   @app.route('/categories')
   def retrieve_categories():
-    all_categories = Category.query.order_by(Category.id).all()
+    types, body, etag = category_registry.get()
 
-    if len(all_categories) == 0:
+    if len(types) == 0:
       abort(404)
 
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # cacheable, but revalidated every time so an invalidation shows at once
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+  @app.route('/admin/categories/invalidate', methods=['POST'])
+  def invalidate_categories():
+    admin_token = config.get('admin_token', ADMIN_TOKEN)
+    if not admin_token:
+      abort(404)
+    if request.headers.get('X-Admin-Token') != admin_token:
+      abort(403)
+
+    category_registry.invalidate()
+    types, body, etag = category_registry.get()
     return jsonify({
       'success': True,
-      'categories': all_categories,
-      'total_categories': len(all_categories)
+      'total_categories': len(types),
+      'etag': etag
     })
 
   '''
@@ -66,6 +125,22 @@ def create_app(test_config=None):
   ten questions per page and pagination at the bottom of the screen for three pages.
   Clicking on the page numbers should update the questions. 
   '''
+  @app.route('/questions')
+  def retrieve_questions():
+    current_questions, total, next_cursor = paginate_questions(
+      request, Question.query, question_counts, 'questions')
+
+    if len(current_questions) == 0:
+      abort(404)
+
+    return jsonify({
+      'success': True,
+      'questions': current_questions,
+      'total_questions': total,
+      'next_cursor': next_cursor,
+      'categories': category_registry.types,
+      'current_category': None
+    })
 
   '''
   @TODO: 
@@ -85,6 +160,65 @@ def create_app(test_config=None):
   the form will clear and the question will appear at the end of the last page
   of the questions list in the "List" tab.  
   '''
+  @app.route('/questions/batch', methods=['POST'])
+  def create_questions():
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+      body = body.get('questions')
+    if body is None:
+      abort(400)
+    if isinstance(body, list) and len(body) > batch.MAX_BATCH_SIZE:
+      abort(422, 'at most {} questions per batch'.format(batch.MAX_BATCH_SIZE))
+
+    try:
+      rows = batch.validate_questions(body)
+    except ValueError as e:
+      abort(422, str(e))
+
+    try:
+      ids = batch.insert_questions(rows)
+      db.session.commit()
+    except SQLAlchemyError:
+      db.session.rollback()
+      abort(422)
+    batch.notify_inserted(rows, ids)
+    question_counts.clear()
+
+    return jsonify({
+      'success': True,
+      'created': ids,
+      'total_questions': question_counts.get('questions', Question.query)
+    })
+
+  @app.route('/questions/batch', methods=['DELETE'])
+  def delete_questions():
+    body = request.get_json(silent=True)
+    ids = body.get('ids') if isinstance(body, dict) else body
+    if not isinstance(ids, list) or not ids:
+      abort(400)
+    if len(ids) > batch.MAX_BATCH_SIZE:
+      abort(422, 'at most {} questions per batch'.format(batch.MAX_BATCH_SIZE))
+    try:
+      ids = [int(id) for id in ids]
+    except (TypeError, ValueError):
+      abort(422)
+
+    try:
+      deleted = batch.delete_questions(ids)
+      db.session.commit()
+    except SQLAlchemyError:
+      db.session.rollback()
+      abort(422)
+    if not deleted:
+      abort(404)
+    batch.notify_deleted(deleted)
+    question_counts.clear()
+
+    return jsonify({
+      'success': True,
+      'deleted': sorted(id for id, _ in deleted),
+      'total_questions': question_counts.get('questions', Question.query)
+    })
 
   '''
   @TODO: 
@@ -96,6 +230,28 @@ def create_app(test_config=None):
   only question that include that string within their question. 
   Try using the word "title" to start. 
   '''
+  @app.route('/questions', methods=['POST'])
+  def search_questions():
+    body = request.get_json(silent=True)
+    if body is None or body.get('searchTerm') is None:
+      abort(400)
+
+    category_id = body.get('category')
+    try:
+      category_id = int(category_id) if category_id else None
+    except (TypeError, ValueError):
+      abort(422)
+
+    page, per_page, _ = page_args(request, QUESTIONS_PER_PAGE)
+    total, questions = question_search.search(
+      str(body['searchTerm']), category_id, page, per_page)
+
+    return jsonify({
+      'success': True,
+      'questions': [question.format() for question in questions],
+      'total_questions': total,
+      'current_category': category_registry.types.get(category_id)
+    })
 
   '''
   @TODO: 
@@ -105,6 +261,25 @@ def create_app(test_config=None):
   categories in the left column will cause only questions of that 
   category to be shown. 
   '''
+  @app.route('/categories/<int:category_id>/questions')
+  def retrieve_category_questions(category_id):
+    category = Category.query.get(category_id)
+    if category is None:
+      abort(404)
+
+    current_questions, total, next_cursor = paginate_questions(
+      request,
+      Question.query.filter(Question.category == str(category_id)),
+      question_counts,
+      'category:{}'.format(category_id))
+
+    return jsonify({
+      'success': True,
+      'questions': current_questions,
+      'total_questions': total,
+      'next_cursor': next_cursor,
+      'current_category': category.type
+    })
 
 
   '''
@@ -118,13 +293,87 @@ def create_app(test_config=None):
   one question at a time is displayed, the user is allowed to answer
   and shown whether they were correct or not. 
   '''
+  @app.route('/quizzes', methods=['POST'])
+  def play_quiz():
+    body = request.get_json(silent=True)
+    if body is None:
+      abort(400)
+
+    previous_questions = body.get('previous_questions', [])
+    quiz_category = body.get('quiz_category') or {}
+    if not isinstance(quiz_category, dict):
+      abort(422)
+    try:
+      previous_questions = [int(id) for id in previous_questions]
+      category_id = int(quiz_category.get('id', 0))
+    except (TypeError, ValueError):
+      abort(422)
+    # question ids are never negative, and sessions store ids below MAX_ID
+    if not all(0 <= id < MAX_ID for id in previous_questions):
+      abort(422)
+
+    # optional server-side session: true starts one, a token continues it,
+    # and the client no longer needs to resend previous_questions
+    token = body.get('quiz_session')
+    seen = None
+    if token is True:
+      token = quiz_sessions.create()
+      seen = quiz_sessions.get(token)
+    elif token:
+      seen = quiz_sessions.get(str(token))
+      if seen is None:
+        abort(404)
+
+    if seen is not None:
+      for id in previous_questions:
+        seen.add(id)
+      previous_questions = seen
+
+    # the frontend sends id 0 for "All"
+    category = ALL_CATEGORIES if category_id == 0 else category_id
+    question = quiz_sampler.next_question(category, previous_questions)
+
+    response = {
+      'success': True,
+      'question': question.format() if question is not None else None
+    }
+    if seen is not None:
+      if question is not None:
+        seen.add(question.id)
+      quiz_sessions.save(token, seen)
+      response['quiz_session'] = token
+    return jsonify(response)
 
   '''
   @TODO: 
   Create error handlers for all expected errors 
   including 404 and 422. 
   '''
+  def error_response(error, message):
+    return jsonify({
+      'success': False,
+      'error': error.code,
+      'message': error.description if error.description != type(error).description else message
+    }), error.code
+
+  @app.errorhandler(400)
+  def bad_request(error):
+    return error_response(error, 'bad request')
+
+  @app.errorhandler(403)
+  def forbidden(error):
+    return error_response(error, 'forbidden')
+
+  @app.errorhandler(404)
+  def not_found(error):
+    return error_response(error, 'resource not found')
+
+  @app.errorhandler(422)
+  def unprocessable(error):
+    return error_response(error, 'unprocessable')
   
+  app.cli.add_command(batch.load_questions)
+
   return app
 
     
\ No newline at end of file
@@ -0,0 +1,143 @@
+import json
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+from models import db, Question, Category
+from . import quiz, search
+
+MAX_BATCH_SIZE = 1000
+# rows per INSERT statement, well under Postgres' 65535 bind parameters
+ROWS_PER_STATEMENT = 1000
+
+
+def validate_questions(items):
+  '''
+  Checks a JSON array of questions and returns them as insert rows.
+  Each needs non-empty question and answer strings, a category id and
+  a difficulty from 1 to 5. Raises ValueError naming the first bad item.
+  '''
+  if not isinstance(items, list) or not items:
+    raise ValueError('expected a non-empty array of questions')
+
+  rows = []
+  for index, item in enumerate(items):
+    try:
+      question = item['question'].strip()
+      answer = item['answer'].strip()
+      category = int(item['category'])
+      difficulty = int(item['difficulty'])
+    except (KeyError, TypeError, ValueError, AttributeError):
+      raise ValueError('question {}: needs question, answer, category and difficulty'.format(index))
+    if not question or not answer or not 1 <= difficulty <= 5:
+      raise ValueError('question {}: empty text or difficulty outside 1-5'.format(index))
+    rows.append({
+      'question': question,
+      'answer': answer,
+      'category': str(category),
+      'difficulty': difficulty
+    })
+  return rows
+
+
+def insert_questions(rows):
+  '''
+  Inserts the rows in the current transaction and returns their new ids,
+  in order. On Postgres each chunk of rows is a single multi-row INSERT
+  ... RETURNING id; other databases get one INSERT per row.
+  '''
+  table = Question.__table__
+  ids = []
+  if db.engine.dialect.name == 'postgresql':
+    for start in range(0, len(rows), ROWS_PER_STATEMENT):
+      chunk = rows[start:start + ROWS_PER_STATEMENT]
+      result = db.session.execute(table.insert().values(chunk).returning(table.c.id))
+      ids.extend(id for id, in result)
+  else:
+    for row in rows:
+      ids.append(db.session.execute(table.insert(), row).inserted_primary_key[0])
+  return ids
+
+
+def delete_questions(ids):
+  '''
+  Deletes the questions with these ids in the current transaction in one
+  statement and returns (id, category) of the ones that existed.
+  '''
+  table = Question.__table__
+  if db.engine.dialect.name == 'postgresql':
+    result = db.session.execute(
+      table.delete().where(table.c.id.in_(ids)).returning(table.c.id, table.c.category))
+    return [tuple(row) for row in result]
+
+  deleted = [tuple(row) for row in db.session.execute(
+    select([table.c.id, table.c.category]).where(table.c.id.in_(ids)))]
+  db.session.execute(table.delete().where(table.c.id.in_(ids)))
+  return deleted
+
+
+def notify_inserted(rows, ids):
+  '''Tells the in-memory quiz pools and search indexes about rows inserted with Core.'''
+  for row, id in zip(rows, ids):
+    quiz.notify_added(id, row['category'])
+    search.notify_added(id, row['question'], row['category'])
+
+
+def notify_deleted(deleted):
+  '''Tells the in-memory quiz pools and search indexes about rows deleted with Core.'''
+  for id, category in deleted:
+    quiz.notify_removed(id, category)
+    search.notify_removed(id)
+
+
+def insert_categories(categories):
+  '''
+  Inserts the {"id", "type"} categories whose id is not taken yet and
+  returns how many were added.
+  '''
+  table = Category.__table__
+  existing = set(id for id, in db.session.query(Category.id))
+  rows = [{'id': int(category['id']), 'type': category['type']}
+          for category in categories if int(category['id']) not in existing]
+  if rows:
+    db.session.execute(table.insert(), rows)
+    if db.engine.dialect.name == 'postgresql':
+      # explicit ids leave the sequence behind
+      db.session.execute(
+        "SELECT setval(pg_get_serial_sequence('categories', 'id'), (SELECT max(id) FROM categories))")
+  return len(rows)
+
+
+@click.command('load-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=ROWS_PER_STATEMENT, show_default=True,
+              help='Questions per transaction.')
+@with_appcontext
+def load_questions(path, batch_size):
+  '''
+  Loads categories and questions from a JSON file, such as trivia.json.
+
+  The file is either an array of questions or an object with "categories"
+  ({"id", "type"} objects) and "questions" arrays. A running server keeps
+  its categories until POST /admin/categories/invalidate.
+  '''
+  with open(path) as f:
+    data = json.load(f)
+  if isinstance(data, list):
+    data = {'questions': data}
+
+  added = insert_categories(data.get('categories', []))
+  db.session.commit()
+
+  try:
+    rows = validate_questions(data.get('questions'))
+  except ValueError as e:
+    raise click.ClickException(str(e))
+
+  loaded = 0
+  for start in range(0, len(rows), batch_size):
+    insert_questions(rows[start:start + batch_size])
+    db.session.commit()
+    loaded += len(rows[start:start + batch_size])
+  click.echo('loaded {} categories and {} questions'.format(added, loaded))
@@ -0,0 +1,47 @@
+import hashlib
+import json
+import threading
+
+from models import Category
+
+
+class CategoryRegistry:
+  '''
+  The categories as an {id: type} map, read once and kept in memory
+  together with the encoded /categories response body and its ETag.
+
+  Categories are only changed by an administrator, so nothing here
+  watches the table: call invalidate() after changing them and the next
+  request reads them again.
+  '''
+  def __init__(self):
+    self.snapshot = None
+    self.lock = threading.Lock()
+
+  def load(self):
+    types = {category.id: category.type
+             for category in Category.query.order_by(Category.id).all()}
+    body = json.dumps({
+      'success': True,
+      'categories': types,
+      'total_categories': len(types)
+    }, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    snapshot = (types, body, etag)
+    with self.lock:
+      self.snapshot = snapshot
+    return snapshot
+
+  def get(self):
+    '''(types, body, etag) of the current categories, loading them if needed.'''
+    with self.lock:
+      snapshot = self.snapshot
+    return snapshot if snapshot is not None else self.load()
+
+  @property
+  def types(self):
+    return self.get()[0]
+
+  def invalidate(self):
+    with self.lock:
+      self.snapshot = None
@@ -0,0 +1,74 @@
+import threading
+import time
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+
+class CountCache:
+  '''
+  Total row counts keyed by listing (e.g. 'questions', 'category:3'),
+  kept for `ttl` seconds so a page request does not run COUNT(*) each time.
+  clear() drops every count and should be called when rows are added or removed.
+  '''
+  def __init__(self, ttl=30):
+    self.ttl = ttl
+    self.counts = {}
+    self.lock = threading.Lock()
+
+  def get(self, key, query):
+    now = time.monotonic()
+    with self.lock:
+      entry = self.counts.get(key)
+      if entry is not None and entry[0] > now:
+        return entry[1]
+
+    total = query.order_by(None).count()
+    with self.lock:
+      self.counts[key] = (now + self.ttl, total)
+    return total
+
+  def clear(self):
+    with self.lock:
+      self.counts.clear()
+
+
+def page_args(request, default_per_page=DEFAULT_PER_PAGE):
+  '''
+  Reads page, per_page and cursor from the query string.
+  per_page is clamped to MAX_PER_PAGE and page to at least 1;
+  cursor is the id of the last row of the previous page, or None.
+  '''
+  page = max(request.args.get('page', 1, type=int), 1)
+  per_page = request.args.get('per_page', default_per_page, type=int)
+  per_page = min(max(per_page, 1), MAX_PER_PAGE)
+  cursor = request.args.get('cursor', None, type=int)
+  return page, per_page, cursor
+
+
+def paginate(query, key, page=1, per_page=DEFAULT_PER_PAGE, cursor=None,
+             counts=None, count_key=None):
+  '''
+  Runs one page of `query`, ordered by the `key` column, in the database.
+
+  With a cursor the page is the rows after it (keyset pagination, cost
+  independent of depth); without one it is LIMIT/OFFSET for `page`.
+  Returns (items, total, next_cursor): items are the row objects,
+  total comes from `counts` when given (keyed by count_key) or a COUNT
+  query, next_cursor is the key of the last row if more may follow.
+  '''
+  if counts is not None and count_key is not None:
+    total = counts.get(count_key, query)
+  else:
+    total = query.order_by(None).count()
+
+  ordered = query.order_by(key)
+  if cursor is not None:
+    items = ordered.filter(key > cursor).limit(per_page).all()
+  else:
+    items = ordered.limit(per_page).offset((page - 1) * per_page).all()
+
+  next_cursor = None
+  if len(items) == per_page:
+    next_cursor = getattr(items[-1], key.key)
+  return items, total, next_cursor
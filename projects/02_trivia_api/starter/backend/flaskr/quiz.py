@@ -0,0 +1,198 @@
+import random
+import threading
+import time
+import weakref
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Question
+
+ALL_CATEGORIES = None
+
+# random draws IdPool.sample tries before the exact O(k) pick
+REJECTION_DRAWS = 8
+
+# live samplers, kept current by the Question mapper events below
+_samplers = weakref.WeakSet()
+
+# session.info key of the pool changes waiting for their transaction to commit
+PENDING_KEY = 'trivia_pending_quiz_changes'
+
+
+class IdPool:
+  '''
+  Array of ids with an id -> position map, so add and remove are O(1)
+  (swap with the last element) and any position can be read directly.
+  '''
+  def __init__(self):
+    self.ids = []
+    self.positions = {}
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, id):
+    if id not in self.positions:
+      self.positions[id] = len(self.ids)
+      self.ids.append(id)
+
+  def remove(self, id):
+    position = self.positions.pop(id, None)
+    if position is None:
+      return
+    last = self.ids.pop()
+    if last != id:
+      self.ids[position] = last
+      self.positions[last] = position
+
+  def sample(self, exclude, rng=random):
+    '''
+    A uniformly random id that is not in `exclude`, or None if every id is.
+    Costs O(k) for k excluded ids, whatever the size of the pool: the
+    excluded positions below n - k are remapped to the free positions
+    at or above n - k, as if the excluded ids had been swapped to the end.
+
+    `exclude` may be any container; when membership is O(1) (a set or a
+    SeenSet) a few random draws are tried first, which usually succeed
+    without looking at the k excluded ids at all.
+    '''
+    if self.ids and not isinstance(exclude, (list, tuple)):
+      for _ in range(REJECTION_DRAWS):
+        id = self.ids[rng.randrange(len(self.ids))]
+        if id not in exclude:
+          return id
+
+    excluded = [self.positions[id] for id in set(exclude) if id in self.positions]
+    remaining = len(self.ids) - len(excluded)
+    if remaining <= 0:
+      return None
+
+    excludedSet = set(excluded)
+    low = [position for position in excluded if position < remaining]
+    free = [position for position in range(remaining, len(self.ids)) if position not in excludedSet]
+    remap = dict(zip(low, free))
+
+    position = rng.randrange(remaining)
+    return self.ids[remap.get(position, position)]
+
+
+class QuizSampler:
+  '''
+  Per-category pools of question ids for picking quiz questions.
+
+  The pools are loaded from the database on first use; after that,
+  questions inserted or deleted through the ORM are added to or removed
+  from them once their transaction commits. Set `ttl` to also reload them every ttl
+  seconds, to pick up rows changed outside the app.
+  '''
+  def __init__(self, ttl=None):
+    self.ttl = ttl
+    self.pools = None
+    self.loaded_at = 0
+    self.lock = threading.Lock()
+    _samplers.add(self)
+
+  def load(self):
+    pools = {ALL_CATEGORIES: IdPool()}
+    for id, category in db.session.query(Question.id, Question.category):
+      pools[ALL_CATEGORIES].add(id)
+      pools.setdefault(str(category), IdPool()).add(id)
+    with self.lock:
+      self.pools = pools
+      self.loaded_at = time.monotonic()
+
+  def ensure_loaded(self):
+    if self.pools is None or (self.ttl is not None and time.monotonic() - self.loaded_at > self.ttl):
+      self.load()
+
+  def added(self, id, category):
+    with self.lock:
+      if self.pools is not None:
+        self.pools[ALL_CATEGORIES].add(id)
+        self.pools.setdefault(str(category), IdPool()).add(id)
+
+  def removed(self, id, category):
+    with self.lock:
+      if self.pools is not None:
+        self.pools[ALL_CATEGORIES].remove(id)
+        if str(category) in self.pools:
+          self.pools[str(category)].remove(id)
+
+  def next_question(self, category, previous_questions):
+    '''
+    A random Question of `category` (ALL_CATEGORIES for any) whose id is
+    not in previous_questions, or None when there is none left.
+    Only the chosen row is read from the database. previous_questions
+    may be a list of ids or a set-like container such as a SeenSet.
+    '''
+    self.ensure_loaded()
+    key = ALL_CATEGORIES if category is ALL_CATEGORIES else str(category)
+    exclude = set(previous_questions) if isinstance(previous_questions, (list, tuple)) else previous_questions
+    while True:
+      with self.lock:
+        pool = self.pools.get(key)
+        id = pool.sample(exclude) if pool is not None else None
+      if id is None:
+        return None
+
+      question = Question.query.get(id)
+      if question is not None:
+        return question
+      # deleted outside the ORM since the last load
+      self.removed(id, key)
+
+
+def notify_added(id, category):
+  for sampler in list(_samplers):
+    sampler.added(id, category)
+
+
+def notify_removed(id, category):
+  for sampler in list(_samplers):
+    sampler.removed(id, category)
+
+
+def notify_moved(id, old_categories, category):
+  for sampler in list(_samplers):
+    for old_category in old_categories:
+      sampler.removed(id, old_category)
+    sampler.added(id, category)
+
+
+def pending(target, notify, *args):
+  '''
+  Queues notify(*args) on the target's session, to run once the flushed
+  change commits; a rollback discards it.
+  '''
+  session = object_session(target)
+  if session is not None:
+    session.info.setdefault(PENDING_KEY, []).append((notify, args))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_pending(session):
+  for notify, args in session.info.pop(PENDING_KEY, ()):
+    notify(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def drop_pending(session):
+  session.info.pop(PENDING_KEY, None)
+
+
+@event.listens_for(Question, 'after_insert')
+def question_inserted(mapper, connection, target):
+  pending(target, notify_added, target.id, target.category)
+
+
+@event.listens_for(Question, 'after_delete')
+def question_deleted(mapper, connection, target):
+  pending(target, notify_removed, target.id, target.category)
+
+
+@event.listens_for(Question, 'after_update')
+def question_updated(mapper, connection, target):
+  history = inspect(target).attrs.category.history
+  if history.has_changes():
+    pending(target, notify_moved, target.id, list(history.deleted), target.category)
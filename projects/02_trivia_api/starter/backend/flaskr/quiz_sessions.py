@@ -0,0 +1,149 @@
+import secrets
+import sqlite3
+import threading
+import time
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+# to_bytes() numbers chunks with 4 bytes
+MAX_ID = 1 << (32 + CHUNK_BITS)
+
+
+class SeenSet:
+  '''
+  Compact set of question ids, roaring style: ids are split into chunks
+  of 65536 by their high bits and each chunk present is one int bitset.
+  Membership and add are O(1); a quiz over a handful of questions takes a
+  few bytes, and a chunk never grows past 8KB.
+  '''
+  def __init__(self, chunks=None):
+    self.chunks = chunks or {}
+
+  def add(self, id):
+    if not 0 <= id < MAX_ID:
+      raise ValueError('question id out of range: {}'.format(id))
+    high, low = divmod(id, CHUNK_SIZE)
+    self.chunks[high] = self.chunks.get(high, 0) | (1 << low)
+
+  def __contains__(self, id):
+    if not isinstance(id, int) or id < 0:
+      return False
+    high, low = divmod(id, CHUNK_SIZE)
+    return bool(self.chunks.get(high, 0) >> low & 1)
+
+  def __iter__(self):
+    for high in sorted(self.chunks):
+      bits = self.chunks[high]
+      while bits:
+        lowest = bits & -bits
+        yield high * CHUNK_SIZE + lowest.bit_length() - 1
+        bits ^= lowest
+
+  def __len__(self):
+    return sum(bin(bits).count('1') for bits in self.chunks.values())
+
+  def to_bytes(self):
+    # 4-byte chunk number, 2-byte length, then the chunk's significant bytes
+    parts = []
+    for high, bits in sorted(self.chunks.items()):
+      body = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+      parts.append(high.to_bytes(4, 'little') + len(body).to_bytes(2, 'little') + body)
+    return b''.join(parts)
+
+  @classmethod
+  def from_bytes(cls, data):
+    chunks = {}
+    offset = 0
+    while offset < len(data):
+      high = int.from_bytes(data[offset:offset + 4], 'little')
+      length = int.from_bytes(data[offset + 4:offset + 6], 'little')
+      offset += 6
+      chunks[high] = int.from_bytes(data[offset:offset + length], 'little')
+      offset += length
+    return cls(chunks)
+
+
+def new_token():
+  return secrets.token_urlsafe(16)
+
+
+class MemoryQuizSessionStore:
+  '''
+  Quiz sessions in a dict, dropped `ttl` seconds after their last use.
+  Expired sessions are swept at most once per `ttl / 10` seconds.
+  '''
+  def __init__(self, ttl=3600):
+    self.ttl = ttl
+    self.sessions = {}
+    self.swept_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def sweep(self, now):
+    if now - self.swept_at < self.ttl / 10:
+      return
+    self.swept_at = now
+    for token in [token for token, (expires_at, _) in self.sessions.items() if expires_at <= now]:
+      del self.sessions[token]
+
+  def create(self):
+    token = new_token()
+    with self.lock:
+      now = time.monotonic()
+      self.sweep(now)
+      self.sessions[token] = (now + self.ttl, SeenSet())
+    return token
+
+  def get(self, token):
+    with self.lock:
+      now = time.monotonic()
+      entry = self.sessions.get(token)
+      if entry is None or entry[0] <= now:
+        self.sessions.pop(token, None)
+        return None
+      return entry[1]
+
+  def save(self, token, seen):
+    with self.lock:
+      self.sessions[token] = (time.monotonic() + self.ttl, seen)
+
+
+class SqliteQuizSessionStore:
+  '''
+  Quiz sessions in a SQLite file, so they survive restarts and are shared
+  by the worker processes of one host. The seen set is stored as a blob.
+  '''
+  def __init__(self, path, ttl=3600):
+    self.ttl = ttl
+    self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    self.lock = threading.Lock()
+    with self.lock:
+      self.connection.execute(
+        'CREATE TABLE IF NOT EXISTS quiz_sessions ('
+        'token TEXT PRIMARY KEY, seen BLOB NOT NULL, expires_at REAL NOT NULL)')
+      self.connection.execute(
+        'CREATE INDEX IF NOT EXISTS ix_quiz_sessions_expires_at ON quiz_sessions (expires_at)')
+
+  def create(self):
+    token = new_token()
+    now = time.time()
+    with self.lock:
+      self.connection.execute('DELETE FROM quiz_sessions WHERE expires_at <= ?', (now,))
+      self.connection.execute(
+        'INSERT INTO quiz_sessions (token, seen, expires_at) VALUES (?, ?, ?)',
+        (token, b'', now + self.ttl))
+    return token
+
+  def get(self, token):
+    with self.lock:
+      row = self.connection.execute(
+        'SELECT seen FROM quiz_sessions WHERE token = ? AND expires_at > ?',
+        (token, time.time())).fetchone()
+    if row is None:
+      return None
+    return SeenSet.from_bytes(row[0])
+
+  def save(self, token, seen):
+    with self.lock:
+      self.connection.execute(
+        'UPDATE quiz_sessions SET seen = ?, expires_at = ? WHERE token = ?',
+        (seen.to_bytes(), time.time() + self.ttl, token))
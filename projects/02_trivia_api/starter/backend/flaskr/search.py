@@ -0,0 +1,209 @@
+import threading
+import weakref
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Question
+
+# live in-memory indexes, kept current by the Question mapper events below
+_indexes = weakref.WeakSet()
+
+# session.info key of the index changes waiting for their transaction to commit
+PENDING_KEY = 'trivia_pending_search_changes'
+
+
+def like_pattern(term):
+  '''ILIKE pattern matching `term` anywhere, with % and _ taken literally.'''
+  escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+  return '%{}%'.format(escaped)
+
+
+def trigrams(text):
+  '''The set of 3-character substrings of the case-folded text.'''
+  text = text.casefold()
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(term_trigrams, text_trigrams):
+  '''Shared trigrams over all trigrams, as pg_trgm's similarity() does.'''
+  if not term_trigrams or not text_trigrams:
+    return 0.0
+  shared = len(term_trigrams & text_trigrams)
+  return shared / (len(term_trigrams) + len(text_trigrams) - shared)
+
+
+class PostgresSearch:
+  '''
+  Substring search in the database: the ILIKE is answered from the
+  ix_questions_question_trgm GIN index that setup_db creates, ranked by
+  similarity(), with the total counted by a window over the same query.
+  '''
+  def search(self, term, category=None, page=1, per_page=10):
+    query = db.session.query(Question, func.count().over().label('total')) \
+      .filter(Question.question.ilike(like_pattern(term)))
+    if category is not None:
+      query = query.filter(Question.category == str(category))
+    rows = query \
+      .order_by(func.similarity(Question.question, term).desc(), Question.id) \
+      .limit(per_page) \
+      .offset((page - 1) * per_page) \
+      .all()
+
+    if not rows:
+      # past the last page the window has nothing to count
+      return self.count(term, category) if page > 1 else 0, []
+    return rows[0].total, [row.Question for row in rows]
+
+  def count(self, term, category):
+    query = Question.query.filter(Question.question.ilike(like_pattern(term)))
+    if category is not None:
+      query = query.filter(Question.category == str(category))
+    return query.count()
+
+
+class MemorySearch:
+  '''
+  Substring search without database support (SQLite): an inverted index
+  from trigram to question ids, built on first use and kept current by
+  the Question mapper events once their transaction commits. A term's candidates are the questions that
+  have all of its trigrams; they are then checked for the substring.
+  '''
+  def __init__(self):
+    self.documents = None
+    self.postings = {}
+    self.lock = threading.Lock()
+    _indexes.add(self)
+
+  def load(self):
+    with self.lock:
+      self.documents = {}
+      self.postings = {}
+    for id, text, category in db.session.query(Question.id, Question.question, Question.category):
+      self.added(id, text, category)
+
+  def added(self, id, text, category):
+    with self.lock:
+      if self.documents is None:
+        return
+      folded = (text or '').casefold()
+      self.documents[id] = (folded, trigrams(folded), str(category))
+      for trigram in self.documents[id][1]:
+        self.postings.setdefault(trigram, set()).add(id)
+
+  def removed(self, id):
+    with self.lock:
+      if self.documents is None:
+        return
+      document = self.documents.pop(id, None)
+      if document is None:
+        return
+      for trigram in document[1]:
+        ids = self.postings.get(trigram)
+        if ids is not None:
+          ids.discard(id)
+          if not ids:
+            del self.postings[trigram]
+
+  def matching_ids(self, term, category):
+    folded = term.casefold()
+    term_trigrams = trigrams(folded)
+    with self.lock:
+      if term_trigrams:
+        candidates = set.intersection(*(self.postings.get(trigram, set()) for trigram in term_trigrams))
+      else:
+        # shorter than a trigram, every question is a candidate
+        candidates = set(self.documents)
+      ranked = []
+      for id in candidates:
+        text, text_trigrams, text_category = self.documents[id]
+        if folded in text and (category is None or text_category == str(category)):
+          ranked.append((-similarity(term_trigrams, text_trigrams), id))
+    ranked.sort()
+    return [id for _, id in ranked]
+
+  def search(self, term, category=None, page=1, per_page=10):
+    if self.documents is None:
+      self.load()
+    ids = self.matching_ids(term, category)
+    page_ids = ids[(page - 1) * per_page:page * per_page]
+    if not page_ids:
+      return len(ids), []
+
+    questions = {question.id: question
+                 for question in Question.query.filter(Question.id.in_(page_ids))}
+    return len(ids), [questions[id] for id in page_ids if id in questions]
+
+
+class QuestionSearch:
+  '''
+  Ranked substring search over question text, optionally within one
+  category, one page at a time. Uses the trigram index on Postgres and
+  the in-memory index on other databases.
+  '''
+  def __init__(self):
+    self.backend = None
+
+  def search(self, term, category=None, page=1, per_page=10):
+    '''Returns (total, questions): the number of matches and one page of them, best first.'''
+    if self.backend is None:
+      if db.engine.dialect.name == 'postgresql':
+        self.backend = PostgresSearch()
+      else:
+        self.backend = MemorySearch()
+    return self.backend.search(term, category, page, per_page)
+
+
+def notify_added(id, text, category):
+  for index in list(_indexes):
+    index.added(id, text, category)
+
+
+def notify_removed(id):
+  for index in list(_indexes):
+    index.removed(id)
+
+
+def notify_updated(id, text, category):
+  for index in list(_indexes):
+    index.removed(id)
+    index.added(id, text, category)
+
+
+def pending(target, notify, *args):
+  '''
+  Queues notify(*args) on the target's session. The mapper events fire at
+  flush, so the values are read then, but the indexes only see them once
+  the transaction commits; a rollback discards them.
+  '''
+  session = object_session(target)
+  if session is not None:
+    session.info.setdefault(PENDING_KEY, []).append((notify, args))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_pending(session):
+  for notify, args in session.info.pop(PENDING_KEY, ()):
+    notify(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def drop_pending(session):
+  session.info.pop(PENDING_KEY, None)
+
+
+@event.listens_for(Question, 'after_insert')
+def question_inserted(mapper, connection, target):
+  pending(target, notify_added, target.id, target.question, target.category)
+
+
+@event.listens_for(Question, 'after_delete')
+def question_deleted(mapper, connection, target):
+  pending(target, notify_removed, target.id)
+
+
+@event.listens_for(Question, 'after_update')
+def question_updated(mapper, connection, target):
+  state = inspect(target)
+  if state.attrs.question.history.has_changes() or state.attrs.category.history.has_changes():
+    pending(target, notify_updated, target.id, target.question, target.category)
@@ -3,6 +3,8 @@ from sqlalchemy import Column, String, Integer, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from db_pool import engine_options, register_health_routes
+
 database_name = "trivia"
 database_path = "postgres://{}/{}".format('localhost:5432', database_name)
 
@@ -10,14 +12,35 @@ db = SQLAlchemy()
 
 '''
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service,
+    with pool settings from the DB_POOL_* environment (see db_pool.py)
+    and the /healthz and /metrics routes
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
+    register_health_routes(app, db)
     db.create_all()
+    create_search_indexes()
+
+'''
+create_search_indexes()
+    on Postgres, creates the trigram index that question search uses
+    and an index on the question category, if they do not exist yet
+'''
+def create_search_indexes():
+    if db.engine.dialect.name != 'postgresql':
+        return
+    db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    db.session.execute(
+        'CREATE INDEX IF NOT EXISTS ix_questions_question_trgm '
+        'ON questions USING gin (question gin_trgm_ops)')
+    db.session.execute(
+        'CREATE INDEX IF NOT EXISTS ix_questions_category ON questions (category)')
+    db.session.commit()
 
 '''
 Question
@@ -2,9 +2,13 @@ import os
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.quiz_sessions import SeenSet
+from models import setup_db, Question, Category, db
+from db_pool import MeteredQueuePool, engine_options, pool_status
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -12,29 +16,404 @@ class TriviaTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
-        self.client = self.app.test_client
         self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
+        self.database_path = os.environ.get(
+            'TRIVIA_TEST_DATABASE_URL',
+            "postgres://{}/{}".format('localhost:5432', self.database_name))
+        self.app = create_app({'database_path': self.database_path, 'admin_token': 'secret'})
+        self.client = self.app.test_client
 
         # binds the app to the current context
         with self.app.app_context():
             self.db = SQLAlchemy()
             self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
+            # start every test from the same data
+            db.drop_all()
+            db.create_all()
+            self.seed()
+        # the categories were read before seeding
+        self.app.category_registry.invalidate()
+
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def seed(self):
+        """Two categories, 25 questions in the first and 5 in the second"""
+        db.session.add_all([Category('Science'), Category('Art')])
+        for i in range(30):
+            category = '1' if i < 25 else '2'
+            db.session.add(Question('Question %d?' % i, 'Answer %d' % i, category, 1 + i % 5))
+        db.session.commit()
 
     """
     TODO
     Write at least one test for each test for successful operation and for expected errors.
     """
 
+    def test_get_categories(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['categories'], {'1': 'Science', '2': 'Art'})
+        self.assertEqual(data['total_categories'], 2)
+        self.assertTrue(res.headers['ETag'])
+
+    def test_304_categories_not_modified(self):
+        etag = self.client().get('/categories').headers['ETag']
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+    def test_invalidate_categories(self):
+        etag = self.client().get('/categories').headers['ETag']
+        with self.app.app_context():
+            db.session.add(Category('History'))
+            db.session.commit()
+        # unchanged until the admin hook is called
+        self.assertEqual(self.client().get('/categories').headers['ETag'], etag)
+
+        res = self.client().post('/admin/categories/invalidate', headers={'X-Admin-Token': 'secret'})
+        data = json.loads(res.data)
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(data['total_categories'], 3)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['categories']['3'], 'History')
+
+    def test_403_invalidate_categories_without_token(self):
+        res = self.client().post('/admin/categories/invalidate')
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_get_paginated_questions(self):
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['questions']), 10)
+        self.assertEqual(data['total_questions'], 30)
+        self.assertEqual(data['categories'], {'1': 'Science', '2': 'Art'})
+
+    def test_get_questions_page_and_per_page(self):
+        res = self.client().get('/questions?page=2&per_page=25')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([q['id'] for q in data['questions']], list(range(26, 31)))
+
+    def test_get_questions_by_cursor(self):
+        first = json.loads(self.client().get('/questions').data)
+        res = self.client().get('/questions?cursor={}'.format(first['next_cursor']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'][0]['id'], first['questions'][-1]['id'] + 1)
+        self.assertEqual(len(data['questions']), 10)
+
+    def test_404_questions_page_beyond_range(self):
+        res = self.client().get('/questions?page=1000')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_get_category_questions(self):
+        res = self.client().get('/categories/2/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 5)
+        self.assertEqual(data['current_category'], 'Art')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_404_questions_of_missing_category(self):
+        res = self.client().get('/categories/1000/questions')
+
+        self.assertEqual(res.status_code, 404)
+
+    def search(self, body, query=''):
+        res = self.client().post('/questions' + query, json=body)
+        return res, json.loads(res.data)
+
+    def test_search_questions(self):
+        res, data = self.search({'searchTerm': 'question 2'})
+
+        self.assertEqual(res.status_code, 200)
+        # Question 2? first, then Question 20? to 29?
+        self.assertEqual(data['total_questions'], 11)
+        self.assertEqual(data['questions'][0]['question'], 'Question 2?')
+        self.assertEqual(len(data['questions']), 10)
+
+    def test_search_questions_in_category(self):
+        res, data = self.search({'searchTerm': 'QUESTION 2', 'category': 2})
+
+        self.assertEqual(data['total_questions'], 5)
+        self.assertEqual(data['current_category'], 'Art')
+        self.assertTrue(all(question['category'] == '2' for question in data['questions']))
+
+    def test_search_questions_page(self):
+        res, data = self.search({'searchTerm': 'question 2'}, '?page=2')
+
+        self.assertEqual(data['total_questions'], 11)
+        self.assertEqual(len(data['questions']), 1)
+
+    def test_search_questions_sees_new_questions(self):
+        with self.app.app_context():
+            self.app.question_search.search('anything')
+            Question('Who painted 100% of the Mona Lisa?', 'Leonardo', '2', 3).insert()
+        res, data = self.search({'searchTerm': '100%'})
+
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Leonardo')
+
+    def test_search_questions_ignores_rolled_back_questions(self):
+        with self.app.app_context():
+            self.app.question_search.search('anything')
+            db.session.add(Question('Who painted the Mona Lisa?', 'Leonardo', '2', 3))
+            db.session.flush()
+            db.session.rollback()
+        res, data = self.search({'searchTerm': 'mona lisa'})
+
+        self.assertEqual(data['total_questions'], 0)
+
+    def test_400_search_questions_without_term(self):
+        res = self.client().post('/questions', json={})
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_create_questions_batch(self):
+        self.search({'searchTerm': 'batch'})
+        res = self.client().post('/questions/batch', json=[
+            {'question': 'Batch 1?', 'answer': 'One', 'category': 2, 'difficulty': 1},
+            {'question': 'Batch 2?', 'answer': 'Two', 'category': '2', 'difficulty': 5}])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['created'], [31, 32])
+        self.assertEqual(data['total_questions'], 32)
+        # visible to the in-memory quiz pools and search index
+        res, found = self.search({'searchTerm': 'batch'})
+        self.assertEqual(found['total_questions'], 2)
+
+    def test_422_create_questions_batch_with_bad_item(self):
+        res = self.client().post('/questions/batch', json={'questions': [
+            {'question': 'Fine?', 'answer': 'Yes', 'category': 1, 'difficulty': 1},
+            {'question': 'No answer?', 'category': 1, 'difficulty': 1}]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertIn('question 1', data['message'])
+        with self.app.app_context():
+            self.assertEqual(Question.query.count(), 30)
+
+    def test_delete_questions_batch(self):
+        self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 2}})
+        res = self.client().delete('/questions/batch', json={'ids': [26, 27, 1000]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], [26, 27])
+        self.assertEqual(data['total_questions'], 28)
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [28, 29, 30],
+            'quiz_category': {'id': 2}})
+        self.assertIsNone(json.loads(res.data)['question'])
+
+    def test_404_delete_questions_batch_of_missing_ids(self):
+        res = self.client().delete('/questions/batch', json=[1000, 1001])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_load_questions_command(self):
+        with self.app.app_context():
+            db.session.query(Question).delete()
+            db.session.commit()
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.json')
+        result = self.app.test_cli_runner().invoke(args=['load-questions', path])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('loaded 4 categories and 19 questions', result.output)
+        with self.app.app_context():
+            self.assertEqual(Question.query.count(), 19)
+            self.assertEqual(Category.query.count(), 6)
+
+    def test_play_quiz_excludes_previous_questions(self):
+        previous = list(range(1, 25))
+        res = self.client().post('/quizzes', json={
+            'previous_questions': previous,
+            'quiz_category': {'type': 'Science', 'id': 1}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], 25)
+
+    def test_play_quiz_all_categories(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {'type': 'click', 'id': 0}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(data['question']['id'], range(1, 31))
+
+    def test_play_quiz_ends_when_category_exhausted(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [26, 27, 28, 29, 30],
+            'quiz_category': {'type': 'Art', 'id': 2}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(data['question'])
+
+    def test_play_quiz_sees_new_questions(self):
+        self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 2}})
+        with self.app.app_context():
+            Question('New?', 'Yes', '2', 1).insert()
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [26, 27, 28, 29, 30],
+            'quiz_category': {'type': 'Art', 'id': 2}})
+        data = json.loads(res.data)
+
+        self.assertEqual(data['question']['question'], 'New?')
+
+    def test_play_quiz_keeps_questions_whose_delete_rolled_back(self):
+        self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 2}})
+        with self.app.app_context():
+            db.session.delete(Question.query.get(26))
+            db.session.flush()
+            db.session.rollback()
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [27, 28, 29, 30],
+            'quiz_category': {'type': 'Art', 'id': 2}})
+        data = json.loads(res.data)
+
+        self.assertEqual(data['question']['id'], 26)
+
+    def test_400_play_quiz_without_body(self):
+        res = self.client().post('/quizzes')
+
+        self.assertEqual(res.status_code, 400)
+
+    def play_session(self, client, token, category_id):
+        res = client.post('/quizzes', json={
+            'quiz_session': token,
+            'quiz_category': {'id': category_id}})
+        return res, json.loads(res.data)
+
+    def test_play_quiz_session_never_repeats(self):
+        client = self.client()
+        res, data = self.play_session(client, True, 2)
+        token = data['quiz_session']
+        seen = [data['question']['id']]
+        for _ in range(4):
+            res, data = self.play_session(client, token, 2)
+            seen.append(data['question']['id'])
+        res, data = self.play_session(client, token, 2)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(sorted(seen), [26, 27, 28, 29, 30])
+        self.assertIsNone(data['question'])
+
+    def test_play_quiz_session_in_sqlite(self):
+        path = '/tmp/trivia_quiz_sessions_test.db'
+        if os.path.exists(path):
+            os.remove(path)
+        app = create_app({'database_path': self.database_path, 'quiz_session_database': path})
+        res, data = self.play_session(app.test_client(), True, 2)
+        token = data['quiz_session']
+
+        # a second app on the same file continues the session
+        app = create_app({'database_path': self.database_path, 'quiz_session_database': path})
+        res, data = self.play_session(app.test_client(), token, 2)
+        os.remove(path)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['quiz_session'], token)
+        self.assertEqual(len(app.quiz_sessions.get(token)), 2)
+
+    def test_404_play_quiz_unknown_session(self):
+        res = self.client().post('/quizzes', json={
+            'quiz_session': 'no-such-session',
+            'quiz_category': {'id': 2}})
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_422_play_quiz_category_not_an_object(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': '1'})
+
+        self.assertEqual(res.status_code, 422)
+
+    def test_422_play_quiz_question_id_out_of_range(self):
+        for id in (-1, 2 ** 48):
+            res = self.client().post('/quizzes', json={
+                'quiz_session': True,
+                'previous_questions': [id],
+                'quiz_category': {'id': 2}})
+
+            self.assertEqual(res.status_code, 422)
+
+    def test_seen_set_round_trip(self):
+        seen = SeenSet()
+        for id in (1, 5, 65535, 65536, 10 ** 7):
+            seen.add(id)
+        copy = SeenSet.from_bytes(seen.to_bytes())
+
+        self.assertEqual(list(copy), [1, 5, 65535, 65536, 10 ** 7])
+        self.assertIn(65536, copy)
+        self.assertNotIn(2, copy)
+
+    def test_healthz(self):
+        res = self.client().get('/healthz')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['healthy'])
+
+    def test_engine_options_from_environment(self):
+        options = engine_options('postgresql://localhost/trivia', {
+            'DB_POOL_SIZE': '20', 'DB_POOL_PRE_PING': '0', 'DB_STATEMENT_TIMEOUT_MS': '5000'})
+
+        self.assertEqual(options['pool_size'], 20)
+        self.assertFalse(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args'], {'options': '-c statement_timeout=5000'})
+        self.assertEqual(engine_options('sqlite://'), {})
+
+    def test_pool_metrics_count_exhaustion(self):
+        engine = create_engine('sqlite:////tmp/trivia_pool_test.db', poolclass=MeteredQueuePool,
+                               pool_size=1, max_overflow=0, pool_timeout=0.01)
+        connection = engine.connect()
+        self.assertTrue(pool_status(engine.pool)['exhausted'])
+        with self.assertRaises(TimeoutError):
+            engine.connect()
+        status = pool_status(engine.pool)
+        connection.close()
+        engine.dispose()
+        os.remove('/tmp/trivia_pool_test.db')
+
+        self.assertEqual(status['checkouts'], 1)
+        self.assertEqual(status['connections_opened'], 1)
+        self.assertEqual(status['exhausted_waits'], 1)
+        self.assertEqual(status['timeouts'], 1)
+        self.assertEqual(status['capacity'], 1)
+        self.assertFalse(status['healthy'])
+
+    def test_db_pool_is_the_shared_copy(self):
+        # edit projects/shared/db_pool.py and run shared/vendor.py instead
+        here = os.path.dirname(os.path.abspath(__file__))
+        shared = os.path.join(here, '..', '..', '..', 'shared', 'db_pool.py')
+        with open(os.path.join(here, 'db_pool.py'), 'rb') as copy, open(shared, 'rb') as source:
+            self.assertEqual(copy.read(), source.read())
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -1,11 +1,12 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink
 from .auth.auth import AuthError, requires_auth
+from .menu import MenuSnapshot
 
 app = Flask(__name__)
 setup_db(app)
@@ -18,6 +19,60 @@ CORS(app)
 '''
 # db_drop_and_create_all()
 
+# longest a GET /drinks/updates request is held open, in seconds
+MENU_UPDATES_TIMEOUT = 25
+# GET /drinks/updates requests held open at once by this process; each
+# holds a server thread, so keep it below the server's thread count
+MENU_UPDATES_MAX_WAITERS = int(os.environ.get('MENU_UPDATES_MAX_WAITERS', 32))
+# seconds a client turned away with 503 is asked to wait
+MENU_UPDATES_RETRY_AFTER = 5
+
+'''
+menu
+    encoded GET /drinks and GET /drinks-detail bodies, rebuilt when a
+    change to the drinks moves the menu version
+'''
+menu = MenuSnapshot(max_waiters=MENU_UPDATES_MAX_WAITERS)
+
+'''
+menu_response(form)
+    the cached menu body with its ETag and version
+    answers 304 Not Modified to a matching If-None-Match
+'''
+def menu_response(form):
+    version, body, etag = menu.get(form)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['X-Menu-Version'] = str(version)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+'''
+drink_fields(body, partial)
+    the title and recipe of a request body, aborting with 422 if one is
+    missing (unless partial) or malformed; a single recipe part may be
+    sent as an object
+'''
+def drink_fields(body, partial=False):
+    if not isinstance(body, dict):
+        abort(400)
+    fields = {}
+    if 'title' in body or not partial:
+        title = body.get('title')
+        if not isinstance(title, str) or not title.strip():
+            abort(422)
+        fields['title'] = title.strip()
+    if 'recipe' in body or not partial:
+        recipe = body.get('recipe')
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        if not isinstance(recipe, list) or not recipe or not all(
+                isinstance(part, dict) and {'name', 'color', 'parts'} <= set(part)
+                for part in recipe):
+            abort(422)
+        fields['recipe'] = recipe
+    return fields
+
 ## ROUTES
 '''
 @TODO implement endpoint
@@ -27,6 +82,9 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks')
+def get_drinks():
+    return menu_response('short')
 
 
 '''
@@ -37,6 +95,38 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks-detail')
+@requires_auth('get:drinks-detail')
+def get_drinks_detail(payload):
+    return menu_response('long')
+
+'''
+GET /drinks/updates?since=<version>
+    public long-poll for menu changes
+    held open until the menu version differs from `since` (the
+    X-Menu-Version of the client's last menu) or MENU_UPDATES_TIMEOUT
+    seconds pass
+    returns status code 200 and json {"success": True, "version": version, "changed": changed}
+        or status code 503 with a Retry-After header when
+        MENU_UPDATES_MAX_WAITERS requests are already waiting
+'''
+@app.route('/drinks/updates')
+def get_menu_updates():
+    since = request.args.get('since', None, type=int)
+    if since is None:
+        abort(400)
+    version = menu.wait(since, MENU_UPDATES_TIMEOUT)
+    if version is None:
+        return jsonify({
+            'success': False,
+            'error': 503,
+            'message': 'too many clients waiting for menu updates'
+        }), 503, {'Retry-After': str(MENU_UPDATES_RETRY_AFTER)}
+    return jsonify({
+        'success': True,
+        'version': version,
+        'changed': version != since
+    })
 
 
 '''
@@ -48,6 +138,21 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the newly created drink
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks', methods=['POST'])
+@requires_auth('post:drinks')
+def create_drink(payload):
+    drink = Drink(**drink_fields(request.get_json(silent=True)))
+    try:
+        drink.insert()
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        abort(422)
+    menu.notify()
+
+    return jsonify({
+        'success': True,
+        'drinks': [drink.long()]
+    })
 
 
 '''
@@ -61,6 +166,26 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the updated drink
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks/<int:id>', methods=['PATCH'])
+@requires_auth('patch:drinks')
+def update_drink(payload, id):
+    drink = Drink.query.filter(Drink.id == id).one_or_none()
+    if drink is None:
+        abort(404)
+
+    for name, value in drink_fields(request.get_json(silent=True), partial=True).items():
+        setattr(drink, name, value)
+    try:
+        drink.update()
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        abort(422)
+    menu.notify()
+
+    return jsonify({
+        'success': True,
+        'drinks': [drink.long()]
+    })
 
 
 '''
@@ -73,6 +198,24 @@ CORS(app)
     returns status code 200 and json {"success": True, "delete": id} where id is the id of the deleted record
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks/<int:id>', methods=['DELETE'])
+@requires_auth('delete:drinks')
+def delete_drink(payload, id):
+    drink = Drink.query.filter(Drink.id == id).one_or_none()
+    if drink is None:
+        abort(404)
+
+    try:
+        drink.delete()
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        abort(422)
+    menu.notify()
+
+    return jsonify({
+        'success': True,
+        'delete': id
+    })
 
 
 ## Error Handling
@@ -102,9 +245,31 @@ def unprocessable(error):
 @TODO implement error handler for 404
     error handler should conform to general task above 
 '''
+@app.errorhandler(404)
+def not_found(error):
+    return jsonify({
+                    "success": False, 
+                    "error": 404,
+                    "message": "resource not found"
+                    }), 404
+
+@app.errorhandler(400)
+def bad_request(error):
+    return jsonify({
+                    "success": False, 
+                    "error": 400,
+                    "message": "bad request"
+                    }), 400
 
 
 '''
 @TODO implement error handler for AuthError
     error handler should conform to general task above 
 '''
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify({
+                    "success": False, 
+                    "error": error.status_code,
+                    "message": error.error['description']
+                    }), error.status_code
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+
+'''
+VerifiedToken
+    what the cache holds for a token that already passed verify_decode_jwt()
+        payload: the decoded jwt payload
+        permissions: frozenset of the payload permissions, for O(1) checks
+'''
+VerifiedToken = namedtuple('VerifiedToken', ['payload', 'permissions'])
+
+
+'''
+TokenCache
+    bounded LRU of verified tokens, keyed by the sha256 digest of the raw token
+    so the bearer tokens themselves are never kept in memory.
+    an entry expires at the token's exp claim, tokens without exp are not cached.
+
+    EXAMPLE
+        cache = TokenCache(maxsize=1024)
+        verified = cache.get(token)
+        if verified is None:
+            verified = cache.put(token, verify_decode_jwt(token))
+'''
+class TokenCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    '''
+    get(token)
+        returns the VerifiedToken for token, or None on a miss or an expired entry
+    '''
+    def get(self, token):
+        key = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, verified = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return verified
+
+    '''
+    put(token, payload)
+        stores a payload returned by verify_decode_jwt()
+        returns the VerifiedToken, whether or not it could be cached
+        payloads without an exp or a permissions claim are not cached
+    '''
+    def put(self, token, payload):
+        verified = VerifiedToken(
+            payload=payload,
+            permissions=frozenset(payload.get('permissions', ()))
+        )
+        expires_at = payload.get('exp')
+        if not isinstance(expires_at, (int, float)) or 'permissions' not in payload:
+            return verified
+
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = (expires_at, verified)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return verified
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
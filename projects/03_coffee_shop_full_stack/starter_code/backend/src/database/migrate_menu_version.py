@@ -0,0 +1,24 @@
+'''
+migrate_menu_version
+    adds the menu_version table, which db_drop_and_create_all() creates
+    for a new database, to an existing one
+    run once from the backend directory:
+        python -m src.database.migrate_menu_version
+'''
+import sys
+
+from sqlalchemy import create_engine, inspect
+
+from .models import MenuVersion, database_path
+
+
+def migrate(engine):
+    if 'menu_version' in inspect(engine).get_table_names():
+        return 'menu_version already exists'
+    # the table's after_create event inserts the row
+    MenuVersion.__table__.create(engine)
+    return 'menu_version created'
+
+
+if __name__ == '__main__':
+    print(migrate(create_engine(sys.argv[1] if len(sys.argv) > 1 else database_path)))
@@ -0,0 +1,53 @@
+'''
+migrate_recipe_json
+    converts drink.recipe from the original VARCHAR(180) blob of json
+    text to a JSON column, keeping every drink
+    run once from the backend directory:
+        python -m src.database.migrate_recipe_json
+    nothing is changed if a recipe is not valid json
+'''
+import json
+import sys
+
+from sqlalchemy import create_engine, inspect, text
+
+from .models import database_path
+
+'''
+SQLite cannot change a column's type, so the table is rebuilt
+with the new column and the rows copied over
+'''
+SQLITE_REBUILD = [
+    'CREATE TABLE drink_new ('
+    'id INTEGER NOT NULL, title VARCHAR(80), recipe JSON NOT NULL, '
+    'PRIMARY KEY (id), UNIQUE (title))',
+    'INSERT INTO drink_new (id, title, recipe) SELECT id, title, recipe FROM drink',
+    'DROP TABLE drink',
+    'ALTER TABLE drink_new RENAME TO drink',
+]
+
+POSTGRES_ALTER = 'ALTER TABLE drink ALTER COLUMN recipe TYPE JSON USING recipe::json'
+
+
+def migrate(engine):
+    columns = {column['name']: column['type'] for column in inspect(engine).get_columns('drink')}
+    if 'JSON' in str(columns['recipe']).upper():
+        return 'drink.recipe is already a JSON column'
+
+    with engine.begin() as connection:
+        for id, recipe in connection.execute(text('SELECT id, recipe FROM drink')):
+            try:
+                json.loads(recipe)
+            except ValueError:
+                raise SystemExit('drink {} has a recipe that is not valid json: {!r}'.format(id, recipe))
+
+        if engine.dialect.name == 'postgresql':
+            connection.execute(text(POSTGRES_ALTER))
+        else:
+            for statement in SQLITE_REBUILD:
+                connection.execute(text(statement))
+    return 'drink.recipe is now a JSON column'
+
+
+if __name__ == '__main__':
+    print(migrate(create_engine(sys.argv[1] if len(sys.argv) > 1 else database_path)))
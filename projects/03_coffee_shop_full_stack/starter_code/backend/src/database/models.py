@@ -1,23 +1,32 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON, DDL, event, select
+from sqlalchemy.ext.mutable import MutableList
 from flask_sqlalchemy import SQLAlchemy
-import json
+
+from .db_pool import engine_options, register_health_routes
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+database_path = os.environ.get(
+    'DATABASE_URL',
+    "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    DATABASE_URL replaces the sqlite file; a server database is pooled
+    per the DB_POOL_* environment variables (see db_pool.py)
+    adds the /healthz and /metrics routes
 '''
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
+    register_health_routes(app, db)
 
 '''
 db_drop_and_create_all()
@@ -38,33 +47,42 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients, decoded once when the row is loaded
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    # adding, removing or replacing parts is saved; to change a part's
+    # fields, replace the part
+    recipe = Column(MutableList.as_mutable(JSON), nullable=False)
 
     '''
     short()
         short form representation of the Drink model
+        built once and kept until the drink is changed or reloaded
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        cached = self.__dict__.get('_short')
+        if cached is None:
+            short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in self.recipe]
+            cached = self.__dict__['_short'] = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': short_recipe
+            }
+        return cached
 
     '''
     long()
         long form representation of the Drink model
+        built once and kept until the drink is changed or reloaded
     '''
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        cached = self.__dict__.get('_long')
+        if cached is None:
+            cached = self.__dict__['_long'] = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': self.recipe
+            }
+        return cached
 
     '''
     insert()
@@ -104,4 +122,57 @@ class Drink(db.Model):
         db.session.commit()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return '<Drink {} {}>'.format(self.id, self.title)
+
+
+'''
+forget_representations()
+    drops the cached short() and long() forms when a drink's columns are
+    assigned, its recipe is changed in place, or it is expired or refreshed
+'''
+def forget_representations(target, *args):
+    target.__dict__.pop('_short', None)
+    target.__dict__.pop('_long', None)
+
+for attribute in (Drink.id, Drink.title, Drink.recipe):
+    event.listen(attribute, 'set', forget_representations)
+event.listen(Drink.recipe, 'modified', forget_representations)
+event.listen(Drink, 'expire', forget_representations)
+event.listen(Drink, 'refresh', forget_representations)
+
+
+'''
+MenuVersion
+    a single row counting the changes made to the drinks, shared by
+    every server process; bumped in the same transaction as the change
+    (see bump_menu_version) and read by src.menu.MenuSnapshot
+'''
+class MenuVersion(db.Model):
+    __tablename__ = 'menu_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+event.listen(MenuVersion.__table__, 'after_create',
+             DDL('INSERT INTO menu_version (id, version) VALUES (1, 0)'))
+
+'''
+menu_version(connection)
+    the current MenuVersion, 0 before the first change
+'''
+def menu_version(connection):
+    table = MenuVersion.__table__
+    version = connection.execute(select([table.c.version]).where(table.c.id == 1)).scalar()
+    return version or 0
+
+'''
+bump_menu_version()
+    counts a drink inserted, updated or deleted by a flush, on the
+    flush's own connection so that it commits or rolls back with it
+'''
+def bump_menu_version(mapper, connection, target):
+    table = MenuVersion.__table__
+    connection.execute(table.update().where(table.c.id == 1).values(version=table.c.version + 1))
+
+for change in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Drink, change, bump_menu_version)
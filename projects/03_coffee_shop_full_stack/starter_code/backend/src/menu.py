@@ -0,0 +1,83 @@
+import hashlib
+import json
+import threading
+import time
+
+from .database.models import db, Drink, menu_version
+
+'''
+MenuSnapshot
+    the menu in its two served forms, GET /drinks (short) and
+    GET /drinks-detail (long), encoded once per menu version
+    the version is the MenuVersion row, which every change to a drink
+    bumps in its own transaction, so all server processes agree on it
+    the drink handlers call notify() after committing a change to wake
+    the clients of this process waiting in wait() at once; the others
+    notice within poll_interval seconds
+'''
+class MenuSnapshot:
+    def __init__(self, max_waiters=32, poll_interval=1.0):
+        self.max_waiters = max_waiters
+        self.poll_interval = poll_interval
+        self.waiters = 0
+        self.forms = {}
+        self.changed = threading.Condition()
+
+    '''
+    get(form)
+        (version, body, etag) of the 'short' or 'long' menu
+        the etag is a digest of the body, so it stays valid across
+        restarts and between processes serving the same menu
+    '''
+    def get(self, form):
+        version = menu_version(db.session)
+        with self.changed:
+            cached = self.forms.get(form)
+        if cached is not None and cached[0] == version:
+            return cached
+
+        drinks = Drink.query.order_by(Drink.id).all()
+        body = json.dumps({
+            'success': True,
+            'drinks': [drink.short() if form == 'short' else drink.long() for drink in drinks]
+        })
+        snapshot = (version, body, hashlib.sha256(body.encode('utf-8')).hexdigest()[:32])
+        with self.changed:
+            self.forms[form] = snapshot
+        return snapshot
+
+    '''
+    notify()
+        wakes the clients of this process waiting in wait(), after a
+        change to the drinks was committed
+    '''
+    def notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    '''
+    wait(since, timeout)
+        blocks until the version differs from `since` or `timeout`
+        seconds have passed, and returns the current version
+        each check borrows a pooled connection only for its one query
+        returns None at once if max_waiters clients are already waiting,
+        each of them holds a server thread
+    '''
+    def wait(self, since, timeout):
+        with self.changed:
+            if self.waiters >= self.max_waiters:
+                return None
+            self.waiters += 1
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                with db.engine.connect() as connection:
+                    version = menu_version(connection)
+                remaining = deadline - time.monotonic()
+                if version != since or remaining <= 0:
+                    return version
+                with self.changed:
+                    self.changed.wait(min(self.poll_interval, remaining))
+        finally:
+            with self.changed:
+                self.waiters -= 1
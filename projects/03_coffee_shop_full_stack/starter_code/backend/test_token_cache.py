@@ -0,0 +1,130 @@
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from src.auth import auth
+from src.auth.auth import AuthError, requires_auth
+from src.auth.token_cache import TokenCache
+
+
+def payload(permissions=('get:drinks-detail',), exp=None):
+    return {
+        'sub': 'barista',
+        'permissions': list(permissions),
+        'exp': time.time() + 3600 if exp is None else exp
+    }
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """TokenCache on its own"""
+
+    def setUp(self):
+        self.cache = TokenCache(maxsize=2)
+
+    def test_get_returns_put_payload(self):
+        self.cache.put('token', payload())
+        verified = self.cache.get('token')
+
+        self.assertEqual(verified.payload['sub'], 'barista')
+        self.assertEqual(verified.permissions, frozenset(['get:drinks-detail']))
+
+    def test_raw_token_is_not_kept(self):
+        self.cache.put('token', payload())
+
+        self.assertNotIn('token', self.cache._entries)
+        self.assertIn(TokenCache.digest('token'), self.cache._entries)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put('a', payload())
+        self.cache.put('b', payload())
+        self.cache.get('a')
+        self.cache.put('c', payload())
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_entry_expires_at_exp(self):
+        now = time.time()
+        self.cache.put('token', payload(exp=now + 60))
+
+        with mock.patch('time.time', return_value=now + 59):
+            self.assertIsNotNone(self.cache.get('token'))
+        with mock.patch('time.time', return_value=now + 60):
+            self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_payload_without_exp_or_permissions_is_not_cached(self):
+        without_exp = payload()
+        del without_exp['exp']
+        without_permissions = payload()
+        del without_permissions['permissions']
+
+        verified = self.cache.put('a', without_exp)
+        self.cache.put('b', without_permissions)
+
+        self.assertEqual(verified.permissions, frozenset(['get:drinks-detail']))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_stats(self):
+        self.cache.put('token', payload())
+        self.cache.get('token')
+        self.cache.get('token')
+        self.cache.get('other')
+
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'misses': 1, 'size': 1, 'maxsize': 2})
+
+        self.cache.clear()
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2})
+
+
+class RequiresAuthTestCase(unittest.TestCase):
+    """requires_auth with token_cache, verify_decode_jwt replaced by a mock"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        auth.token_cache.clear()
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def call(self, permission, verified_payload, token='token'):
+        view = requires_auth(permission)(lambda payload: payload)
+        with mock.patch.object(auth, 'verify_decode_jwt', return_value=verified_payload) as verify:
+            with self.app.test_request_context(headers={'Authorization': 'Bearer ' + token}):
+                try:
+                    return view(), verify.call_count
+                except AuthError as error:
+                    return error.status_code, verify.call_count
+
+    def test_token_is_verified_once(self):
+        self.assertEqual(self.call('get:drinks-detail', payload())[1], 1)
+        result, verifications = self.call('get:drinks-detail', payload())
+
+        self.assertEqual(result['sub'], 'barista')
+        self.assertEqual(verifications, 0)
+        self.assertEqual(auth.token_cache.stats()['hits'], 1)
+
+    def test_cached_token_is_still_checked_for_the_permission(self):
+        self.call('get:drinks-detail', payload())
+
+        self.assertEqual(self.call('delete:drinks', payload()), (403, 0))
+
+    def test_payload_without_permissions_is_refused_before_caching(self):
+        without_permissions = payload()
+        del without_permissions['permissions']
+
+        self.assertEqual(self.call('get:drinks-detail', without_permissions), (400, 1))
+        self.assertEqual(self.call('get:drinks-detail', without_permissions), (400, 1))
+        self.assertEqual(auth.token_cache.stats()['size'], 0)
+
+    def test_forbidden_token_is_refused_on_first_use(self):
+        self.assertEqual(self.call('delete:drinks', payload()), (403, 1))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
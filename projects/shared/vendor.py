@@ -0,0 +1,61 @@
+'''
+Copies the modules in projects/shared into the projects that use them.
+
+Each project is deployed from its own directory, so it needs its own copy;
+edit the file here and re-run this script from anywhere:
+
+    python shared/vendor.py          copy shared/db_pool.py into every project
+    python shared/vendor.py --check  exit 1 if a copy differs from shared/
+'''
+import argparse
+import os
+import shutil
+import sys
+
+SHARED = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = os.path.dirname(SHARED)
+
+# shared module -> where each project imports it from
+VENDORED = {
+    'db_pool.py': [
+        '01_fyyur/starter_code/db_pool.py',
+        '02_trivia_api/starter/backend/db_pool.py',
+        '03_coffee_shop_full_stack/starter_code/backend/src/database/db_pool.py',
+        'capstone/heroku_sample/starter/db_pool.py',
+    ],
+}
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def stale_copies():
+    for name, copies in VENDORED.items():
+        source = os.path.join(SHARED, name)
+        for copy in copies:
+            target = os.path.join(PROJECTS, copy)
+            if not os.path.exists(target) or read(target) != read(source):
+                yield source, target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--check', action='store_true',
+                        help='only report copies that differ from shared/')
+    args = parser.parse_args()
+
+    stale = list(stale_copies())
+    for source, target in stale:
+        if args.check:
+            print('out of date: {}'.format(os.path.relpath(target, PROJECTS)))
+        else:
+            shutil.copyfile(source, target)
+            print('updated {}'.format(os.path.relpath(target, PROJECTS)))
+    if args.check and stale:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()